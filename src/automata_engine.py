@@ -1,24 +1,38 @@
-from typing import Tuple, List, Dict
-from pygame import Vector3, Vector2
-import random
-from collections import defaultdict
-from math import sqrt
-from helper_functions import point_in_triangle
-
-SQRT3 = sqrt(3)
+from typing import Tuple, List, Optional, TYPE_CHECKING
+import numpy as np
+from spatial_index import TriangleGrid, TriangleBVH
+from cycle_detector import CycleDetector, CycleInfo
+from mesh import Mesh, NEIGHBOURHOODS, to_padded
+from history import HistoryRecorder
+from simulation_stats import StatsHistory, GenerationStats
+from stepping_backends import SteppingBackend, make_backend, select_backend
+from pattern_rules import PatternRule, compile_pattern_table
+
+if TYPE_CHECKING:  # pygame is only needed for the cell views, not for stepping
+    from pygame import Vector3, Vector2
+
+INITIAL_ON_CHANCE = 0.7
+ACTIVE_SET_MAX_FRACTION = 0.05  # Above this fraction of cells to re-evaluate, a full sweep is cheaper
 
 class AutomataCell:
-    """Represents a single triangle cell in a surface-based cellular automaton."""
+    """Represents a single triangle cell in a surface-based cellular automaton.
+    The cell's state lives in its engine's state array, so stepping never touches cell objects."""
 
-    def __init__(self, face_verts: Tuple[Vector3], *, value: float = 0):
+    def __init__(self, engine: 'Engine', index: int, face_verts: Tuple['Vector3']):
+        self.engine = engine
+        self.index = index  # Position of the cell in the engine's state array
         self.verts = face_verts  # Vertices defining the triangle
-
-        self.value: float = value  # Current state of the cell
-        self.next_value: float = 0  # Next state after update
         self.neighbours = []  # Adjacent AutomataCells
 
-        # Precompute a hash based on vertex positions for fast equality and lookup
-        self._hash = hash(tuple(map(tuple, self.verts)))
+    @property
+    def value(self) -> int:
+        """Current state of the cell."""
+        return int(self.engine.values[self.index])
+
+    @value.setter
+    def value(self, value):
+        self.engine.values[self.index] = bool(value)
+        self.engine.values_edited(np.array([self.index]))
 
     def set_neighbours(self, neighbours: List['AutomataCell']):
         """Assigns neighbors to the cell (only once)."""
@@ -26,185 +40,290 @@ class AutomataCell:
             raise RuntimeError("Neighbours already set")
         self.neighbours = neighbours
 
-    def calc_next_value(self, on_rule: Tuple[int, int, int, int], off_rule: Tuple[int, int, int, int]):
-        """Determines the cell's next state based on the rules and neighbor values."""
-        n = sum(map(lambda p: p.value, self.neighbours))  # Count 'on' neighbors
-        self.next_value = on_rule[n] if self.value else off_rule[n]
-
-    def update(self):
-        """Updates the cell's state to the computed next state."""
-        self.value = self.next_value
-
     def get_verts(self):
         """Returns the triangle's vertices."""
         return self.verts
 
-    def __hash__(self):
-        return self._hash
-
-    def __eq__(self, other):
-        if not isinstance(other, AutomataCell):
-            return False
-        return all(a == b for a, b in zip(self.verts, other.verts))
-
     def __str__(self):
         return str(id(self))
 
 
+def neighbour_table(mesh: Mesh, neighbourhood: str = "edge") -> np.ndarray:
+    """
+    Returns the padded (K, F) neighbour indices of a neighbourhood, K being the largest neighbour count.
+    Slots past a cell's last neighbour hold F, the index of an always 'off' padding cell.
+    Raises:
+        ValueError: If the neighbourhood is not one of NEIGHBOURHOODS.
+    """
+    if neighbourhood == "edge":
+        adjacency = mesh.edge_adjacency()
+    elif neighbourhood == "vertex":
+        adjacency = mesh.vertex_adjacency()
+    else:
+        raise ValueError(f"Unknown neighbourhood '{neighbourhood}', expected one of {NEIGHBOURHOODS}")
+    return to_padded(adjacency.indptr, adjacency.indices, len(mesh))
+
+
+def ordered_neighbour_table(mesh: Mesh, neighbourhood: str = "edge") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the padded (K, F) neighbour indices of a neighbourhood with each cell's neighbours in cyclic order,
+    and the (F,) number of neighbours in each cell's ring. Rings all go the same way round, that of the
+    consistent winding from Mesh.orientation (on a non-orientable mesh some neighbouring rings cannot agree).
+    Edge rings always have 3 slots, one per edge in winding order, a boundary edge holding the padding cell.
+    Raises:
+        ValueError: If the neighbourhood is not one of NEIGHBOURHOODS.
+    """
+    flipped = mesh.orientation().flipped
+    if neighbourhood == "edge":
+        across = mesh.edge_adjacency().across
+        across = np.where(flipped[:, None], across[:, [0, 2, 1]], across)  # The same cycle the other way round
+        return np.where(across >= 0, across, len(mesh)).T.copy(), np.full(len(mesh), 3)
+    if neighbourhood == "vertex":
+        adjacency = mesh.ordered_vertex_adjacency()
+        return to_padded(adjacency.indptr, adjacency.indices, len(mesh)), np.diff(adjacency.indptr)
+    raise ValueError(f"Unknown neighbourhood '{neighbourhood}', expected one of {NEIGHBOURHOODS}")
+
+
+def compile_rule_table(on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], max_count: int) -> np.ndarray:
+    """
+    Builds the (2, max_count + 1) lookup table of next values, indexed by [current value, number of 'on' neighbours].
+    Rules shorter than max_count + 1 leave the missing counts 'off', entries past max_count can never apply.
+    """
+    table = np.zeros((2, max_count + 1), dtype=np.uint8)
+    for row, rule in enumerate((off_rule, on_rule)):
+        rule = np.asarray(rule[:max_count + 1], dtype=np.int64)
+        if np.any((rule != 0) & (rule != 1)):
+            raise ValueError(f"Rule entries must be 0 or 1, got {tuple(rule.tolist())}")
+        table[row, :len(rule)] = rule
+    return table
+
+
 class Engine:
     """Handles cellular automaton logic over a mesh of triangle cells."""
 
-    def __init__(self, mesh, on_rule: Tuple[int, int, int, int] = (0, 1, 1, 0), off_rule: Tuple[int, int, int, int] = (0, 1, 1, 0)):
+    def __init__(self, mesh: Mesh, on_rule: Tuple[int, ...] = (0, 1, 1, 0), off_rule: Tuple[int, ...] = (0, 1, 1, 0), *, seed: Optional[int] = None, neighbourhood: str = "edge", backend: Optional[str] = None, patterns: Optional[PatternRule] = None):
+        self.mesh = mesh
+        self.cells: Optional[List[AutomataCell]] = None  # Created on first call to get_cells
+        self.num_cells = num_cells = len(mesh)
+
+        # Cell states. The extra trailing slot is always 0 and is what padded neighbour entries point at.
+        self._state = np.zeros(num_cells + 1, dtype=np.uint8)
+        self.values = self._state[:num_cells]
+        self._changed = np.zeros(0, dtype=np.int64)  # Cells the pending update will flip
+        # Cells whose neighbourhood changed in the last step, the only ones that can change in the next.
+        # None means every cell has to be evaluated.
+        self._active: Optional[np.ndarray] = None
+
+        # Random initial states (70% chance 'on')
+        self.values[:] = np.random.default_rng(seed).random(num_cells) < INITIAL_ON_CHANCE
+        self.version = 0  # Incremented whenever cell values change, so views know when to refresh
+        self.generation = 0
+        # Number of 'on' cells, kept up to date from the cells each step flips
+        self.population = int(np.count_nonzero(self.values))
+        self.stats = StatsHistory(num_cells)
+        self.stats.append(0, self.population, 0, 0)
+        self.cycle_detector = CycleDetector(num_cells)
+        self.history: Optional[HistoryRecorder] = None  # Where states are recorded, if anywhere
+        self._history_version = None  # Version of the last recorded state
         self.on_rule, self.off_rule = on_rule, off_rule
-
-        # Convert mesh faces into AutomataCells, assigning random initial states (70% chance 'on')
-        self.cells = [AutomataCell(face, value=random.randint(0, 100) < 70) for face in mesh]
-
-        # Map vertices to the cells that include them
-        vert_to_cell = defaultdict(list)
-        for cell in self.cells:
-            for vert in cell.get_verts():
-                vert_to_cell[tuple(vert)].append(cell)
-
-        # Identify adjacent cells via shared vertices
-        cell_to_adjacent_cells = defaultdict(list)
-        for vert in vert_to_cell.keys():
-            for cell in vert_to_cell[vert]:
-                cell_to_adjacent_cells[cell].extend(vert_to_cell[vert])
-
-        # Set neighbors as those that share exactly two vertices (edge adjacency)
-        for cell in self.cells:
-            neighbours = cell_to_adjacent_cells[cell]
-            cell.set_neighbours(list(set(filter(lambda x: neighbours.count(x) == 2, neighbours))))
-
-        ## Ordering the neighbours
-        # for cell in self.cells:
-        #     neighbour_to_projected_point = {} ## neighbour to its point projected into the plane defined by the cell
-        #     for neighbour in cell.neighbours:
-        #         neighbour_to_projected_point[neighbour] = proj_point(neighbour.centroid, cell.centroid, cell.normal)
-        #     right = proj_point(get_right(cell.centroid), cell.centroid, cell.normal)
-        #     cell.neighbours.sort(key = lambda p: neighbour_to_projected_point[p].angle_to(right))
-
+        self.patterns = patterns
+        # Kernel finding the cells that change, see stepping_backends. None picks the fastest once the neighbours are known
+        self.backend: Optional[SteppingBackend] = make_backend(backend) if backend else None
+        self._auto_backend = backend is None
+        self._backend_key = None  # (neighbour slots, ordered) the backend was picked for, as calibration depends on them
+        self._neighbours_key = None  # (neighbourhood, ordered) the neighbour table was built for
+        self._ring_sizes: Optional[np.ndarray] = None  # Neighbours in each cell's ring, for pattern rules
+        # Neighbour indices padded out to the widest neighbourhood, stored one column per neighbour slot.
+        # Pattern rules need them in cyclic order, see ordered_neighbour_table
+        self.set_neighbourhood(neighbourhood)
 
     def calc_next_state(self):
-        """Calculates next value for each cell without updating yet."""
-        for cell in self.cells:
-            cell.calc_next_value(self.on_rule, self.off_rule)
+        """Calculates next value for each cell without updating yet.
+        Only cells near last step's changes are evaluated, unless so many changed that a full sweep is cheaper."""
+        self._changed = self.backend.changed_cells(self._state, self.rule_table, self._active)
 
     def update_state(self):
         """Applies the calculated next state to each cell."""
-        for cell in self.cells:
-            cell.update()
-
-    def get_cells(self):
+        if self.history is not None:
+            self._record_history()  # Keeps any edits made since the last step
+        changed = self._changed
+        self.values[changed] ^= 1
+        self._active = self._around(changed)
+        self.generation += 1
+        self.version += 1
+        births = int(np.count_nonzero(self.values[changed]))  # Changed cells that are now on
+        self._record_stats(births, len(changed) - births)
+        self.cycle_detector.record(changed, self.values, self.generation)
+        if self.history is not None:
+            self._record_history()
+
+    def _around(self, cells: np.ndarray) -> Optional[np.ndarray]:
+        """Returns the given cells and their neighbours, or None if that is enough cells to warrant a full sweep."""
+        if len(cells) * (len(self.neighbour_indices) + 1) > ACTIVE_SET_MAX_FRACTION * self.num_cells:
+            return None
+        around = np.unique(np.concatenate([cells, self.neighbour_indices[:, cells].ravel()]))
+        return around[:-1] if len(around) and around[-1] == self.num_cells else around  # Drop the padding slot
+
+    def step(self):
+        """Advances the automaton by one generation."""
+        self.advance(1)
+
+    def advance(self, generations: int):
+        """Advances the automaton by a number of generations.
+        Once a cycle has been found and recorded, it jumps straight to the result instead of stepping."""
+        while generations and not self.cycle_detector.replayable:
+            self.calc_next_state()
+            self.update_state()
+            generations -= 1
+        if generations:
+            self.generation += generations
+            births = deaths = 0
+            if self.cycle_detector.cycle.period > 1:  # A still life never changes
+                values = np.unpackbits(self.cycle_detector.state_at(self.generation), count=self.num_cells)
+                births, deaths = int(np.count_nonzero(values > self.values)), int(np.count_nonzero(values < self.values))
+                self.values[:] = values
+                self.version += 1
+                self._active = None
+            self._record_stats(births, deaths)  # One entry for the whole jump
+            if self.history is not None:
+                self._record_history()
+
+    def record_history(self, recorder: Optional[HistoryRecorder]):
+        """Starts recording every generation (and edited state) to a history file, or stops if given None.
+        A previous recorder is closed."""
+        if self.history is not None:
+            self.history.close()
+        self.history = recorder
+        self._history_version = None
+        if recorder is not None:
+            self._record_history()
+
+    def _record_history(self):
+        if self._history_version != self.version:
+            self.history.append(self.generation, self.values)
+            self._history_version = self.version
+
+    def _record_stats(self, births: int, deaths: int):
+        self.population += births - deaths
+        self.stats.append(self.generation, self.population, births, deaths)
+
+    def get_stats(self) -> GenerationStats:
+        """Returns the population, births, deaths and changed fraction of the current generation, without a pass over the cells."""
+        return self.stats.latest()
+
+    def get_cycle(self) -> Optional[CycleInfo]:
+        """Returns the cycle the automaton has settled into, or None if none has been found yet."""
+        return self.cycle_detector.cycle
+
+    def values_edited(self, cells: Optional[np.ndarray] = None):
+        """Must be called after cell values are changed outside of stepping.
+        Args:
+            cells (Optional[np.ndarray]): Indices of the edited cells, None if they are unknown or most of the mesh.
+        """
+        self.version += 1
+        self.population = int(np.count_nonzero(self.values))
+        if cells is None or self._active is None:
+            self._active = None
+        else:
+            edited = self._around(np.asarray(cells, dtype=np.int64))
+            self._active = None if edited is None else np.union1d(self._active, edited)
+        self.cycle_detector.reset(self.values, self.generation)
+
+    def get_cells(self) -> List[AutomataCell]:
+        """Returns a view object per cell, creating them on first use so headless runs never build them."""
+        if self.cells is None:
+            from pygame import Vector3
+            self.cells = [AutomataCell(self, i, tuple(Vector3(*vert) for vert in face)) for i, face in enumerate(self.mesh.get_triangles())]
+            adjacency = self.mesh.edge_adjacency()
+            for cell in self.cells:
+                cell.set_neighbours([self.cells[j] for j in adjacency.indices[adjacency.indptr[cell.index]:adjacency.indptr[cell.index + 1]]])
         return self.cells
 
-    def make_projection_map(self):
+    def make_projection_map(self) -> np.ndarray:
         """
         Creates a 2D projection of the 3D mesh starting from an arbitrary root cell.
-        Returns a mapping from AutomataCell to its projected 2D triangle.
+        Returns a (num_cells, 3, 2) array holding each cell's projected 2D triangle.
         """
-        root = self.cells[0]
-        tree = self._build_spanning_tree(root)
-        
-        # Start by placing the root triangle flat in 2D space
-        self.projection = {
-            root: (Vector2(0, 0), Vector2(0.1, 0), Vector2(0.05, SQRT3/20))
-        }
-
-        # Recursively layout the rest of the mesh
-        self._traverse_and_place(tree, root)
+        self.projection = self.mesh.projection_layout()
+
+        # Index the projected triangles for fast point lookups
+        self.projection_index = TriangleGrid(self.projection)
         return self.projection
 
-    def get_projection_map(self) -> Dict[AutomataCell, Tuple[Vector2, Vector2, Vector2]]:
+    def get_projection_map(self) -> np.ndarray:
         return self.projection
 
-    def _traverse_and_place(self, tree, parent_triangle):
-        """Recursive function to place each triangle in 2D based on its neighbor and shared edge."""
-        # Parent geometry
-        parent_vertices_3d = parent_triangle.get_verts()
-        parent_vertices_2d = self.projection[parent_triangle]
-
-        # Traverse children of this parent
-        for child_triangle, shared_edge_3d in tree[parent_triangle]:
-            child_vertices_3d = child_triangle.get_verts()
-
-            # --- Step 1: Identify the "new" vertex in 3D ---
-            # The third vertex is the one that is NOT part of the shared edge
-            new_vertex_3d = next(v for v in child_vertices_3d if v not in shared_edge_3d)
-
-            # --- Step 2: Use child’s winding order to decide orientation ---
-            # Look at indices in the child triangle’s own ordering
-            idx_first_shared = child_vertices_3d.index(shared_edge_3d[0])
-            idx_new_vertex = child_vertices_3d.index(new_vertex_3d)
-
-            # If the new vertex follows the first shared vertex cyclically, then place it clockwise relative to the edge in 2D
-            place_clockwise = (idx_new_vertex - idx_first_shared) % 3 == 1
-
-            # Compute new vertex position in 2D
-            shared_vertex_2d_A = parent_vertices_2d[parent_vertices_3d.index(shared_edge_3d[0])]
-            shared_vertex_2d_B = parent_vertices_2d[parent_vertices_3d.index(shared_edge_3d[1])]
-            new_vertex_2d = self._calc_3d_vector(shared_vertex_2d_A, shared_vertex_2d_B, place_clockwise)
-
-            # --- Step 3: Build the child triangle’s 2D coordinates
-            # Placing verts in 2d in the same order as 3d. Not strictly needed for this function but a best practice.
-            child_vertices_2d = []
-            for vertex in child_vertices_3d:
-                if vertex == shared_edge_3d[0]:
-                    child_vertices_2d.append(shared_vertex_2d_A)
-                elif vertex == shared_edge_3d[1]:
-                    child_vertices_2d.append(shared_vertex_2d_B)
-                else:
-                    child_vertices_2d.append(new_vertex_2d)
-
-            self.projection[child_triangle] = tuple(child_vertices_2d)
-            self._traverse_and_place(tree, child_triangle)
-
-
-    def _calc_3d_vector(self, P1: Vector2, P2: Vector2, clockwise: bool):
-        """Rotates vector P2-P1 by ±60 degrees to find the third triangle point in 2D."""
-        V = P2 - P1
-        V_rotated = Vector2.rotate(V, -60 if clockwise else 60)
-        return P1 + V_rotated
-
-    def _build_spanning_tree(self, root: AutomataCell) -> Dict[AutomataCell, List[Tuple[AutomataCell, List[Vector3]]]]:
-        """
-        Builds a spanning tree from the root cell across the mesh using BFS.
-        Used to guide triangle placement in the 2D projection.
-        Parameters:
-            root (AutomataCell): An arbitrary cell that will act as the tree's root 
-        Returns:
-            Dict[AutomataCell, List[Tuple[AutomataCell, List[Vector3]]]]: A mapping between a tree and a list of tuples containing the child AutomataCell and a Vector that is the shared edge in 3D.
-        """
-        tree: Dict[AutomataCell, List[Tuple[AutomataCell, List[Vector3]]]] = defaultdict(list)
-        visited = set()
-        queue = [root]
-        visited.add(root)
-
-        while queue:
-            current = queue.pop(0)
-            current_edges = current.get_verts()
-            for neighbour in current.neighbours:
-                if neighbour not in visited:
-                    neighbour_verts = neighbour.get_verts()
-                    shared_edge = [v for v in current_edges if v in neighbour_verts]
-                    tree[current].append((neighbour, shared_edge))
-                    visited.add(neighbour)
-                    queue.append(neighbour)
-        return tree
+    def make_surface_index(self) -> TriangleBVH:
+        """Builds the BVH over the 3D cells used for picking them with rays."""
+        self.surface_index = TriangleBVH(self.mesh.get_triangles())
+        return self.surface_index
 
     def clear_values(self):
         """Resets all cell values to 0."""
-        for cell in self.cells:
-            cell.value = 0
+        self.values[:] = 0
+        self.values_edited()
 
-    def get_cell_at_pos_in_proj(self, p: Vector2):
+    def get_cell_at_pos_in_proj(self, p: 'Vector2') -> Optional[AutomataCell]:
         """Returns the AutomataCell containing point `p` in the 2D projection."""
-        for cell in self.cells:
-            if point_in_triangle(p, self.projection[cell]):
-                return cell
-
-    def set_rule(self, on_rule: Tuple[int, int, int, int], off_rule: Tuple[int, int, int, int]):
-        """Updates the rule sets used for automaton transitions."""
-        self.on_rule = on_rule
-        self.off_rule = off_rule
\ No newline at end of file
+        index = self.projection_index.query(p[0], p[1])
+        return self.get_cells()[index] if index >= 0 else None
+
+    def get_cell_indices_at_pos_in_proj(self, points: np.ndarray) -> np.ndarray:
+        """Returns the index of the cell containing each (x, y) point in the 2D projection, or -1 where there is none."""
+        return self.projection_index.query_many(points)
+
+    def get_cell_indices_on_rays(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Returns the index of the first cell each (origin, direction) ray hits on the 3D surface, or -1 where it hits none."""
+        return self.surface_index.query_many(origins, directions)
+
+    def set_values(self, indices: np.ndarray, value: int):
+        """Sets the value of a batch of cells, e.g. those under a brush stroke."""
+        self.values[indices] = bool(value)
+        self.values_edited(indices)
+
+    def set_neighbourhood(self, neighbourhood: str):
+        """Switches which cells count as neighbours, one of NEIGHBOURHOODS."""
+        self._set_tables(neighbourhood, self.on_rule, self.off_rule, self.patterns)  # The rule table depends on the neighbours
+
+    def set_rule(self, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], patterns: Optional[PatternRule] = None):
+        """
+        Updates the rule sets used for automaton transitions, entry i being the result for i 'on' neighbours.
+        Args:
+            on_rule (Tuple[int, ...]): Rule applied to cells that are on.
+            off_rule (Tuple[int, ...]): Rule applied to cells that are off.
+            patterns (Optional[PatternRule]): Next values by the pattern of 'on' neighbours around a cell, overriding
+                the rules by count. Patterns are matched under rotation, and also reflection on non-orientable meshes.
+        Raises:
+            ValueError: If a rule or pattern is invalid, see compile_rule_table and compile_pattern_table.
+        """
+        self._set_tables(self.neighbourhood, on_rule, off_rule, patterns)
+
+    def _set_tables(self, neighbourhood: str, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], patterns: Optional[PatternRule]):
+        """Builds the neighbour and rule tables, changing nothing if either cannot be built."""
+        ordered = patterns is not None
+        rebuilt = self._neighbours_key != (neighbourhood, ordered)
+        if not rebuilt:
+            neighbour_indices, ring_sizes = self.neighbour_indices, self._ring_sizes
+        elif ordered:
+            neighbour_indices, ring_sizes = ordered_neighbour_table(self.mesh, neighbourhood)
+        else:
+            neighbour_indices, ring_sizes = neighbour_table(self.mesh, neighbourhood), None
+        # Lookup table indexed by [current value, number of 'on' neighbours]
+        rule_table = compile_rule_table(on_rule, off_rule, len(neighbour_indices))
+        pattern_offsets = None
+        if ordered:
+            # Indexed by [current value, pattern code] instead, every pattern falling back on its count's entry
+            rule_table, pattern_offsets = compile_pattern_table(rule_table, patterns, ring_sizes, not self.mesh.orientation().orientable)
+
+        self.neighbour_indices, self._ring_sizes = neighbour_indices, ring_sizes
+        self.neighbourhood, self._neighbours_key = neighbourhood, (neighbourhood, ordered)
+        self.on_rule, self.off_rule, self.patterns = on_rule, off_rule, patterns
+        self.rule_table = rule_table
+        backend_key = (len(neighbour_indices), ordered)
+        if self._auto_backend and backend_key != self._backend_key:
+            self.backend = select_backend(self._state, self.neighbour_indices, self.rule_table, pattern_offsets)
+        elif rebuilt or ordered:
+            self.backend.prepare(self.neighbour_indices, pattern_offsets)
+        self._backend_key = backend_key
+        self._active = None
+        self.cycle_detector.reset(self.values, self.generation)  # Earlier history says nothing about the new rules
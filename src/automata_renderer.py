@@ -1,60 +1,140 @@
-import math
-import time
+import os
+import tempfile
 
-from pygame import Vector3, Vector2
+import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
 from camera import OrbitalCamera
-import automata_engine
+from helper_functions import cell_colors
+from simulation_worker import SimulationWorker
+from history import HistoryRecorder, HistoryReader
+
+# Vertex pairs of a triangle drawn as lines, the same outline GL_LINE_LOOP would give
+TRIANGLE_OUTLINE = np.array([0, 1, 1, 2, 2, 0], dtype=np.uint32)
 
 
 class CellularAutomataRenderer:
     ZOOM_SENSTIVITY = 0.5
-    """Handles rendering and simulation of the cellular automaton."""
-    def __init__(self, mesh, display_size, starting_changes, starting_state):
-        self.last_update_time = -math.inf # Force a update asap
-        self.update_state(starting_changes, starting_state)
+    BRUSH_SAMPLE_SPACING = 2  # Pixels between the points sampled along a brush stroke
+    """Handles rendering and simulation of the cellular automaton.
+    Mesh and projection geometry live in static vertex buffers; only the per-vertex colours are re-uploaded, and only when the cell values change.
+    The automaton is stepped by a SimulationWorker thread, the renderer draws whichever generation it finished last and sends edits to it."""
+    def __init__(self, automata, display_size, starting_changes, starting_state):
+        """Must be made on the thread owning the GL context.
+        Args:
+            automata (automata_engine.Engine): Engine of the mesh to show, with its projection map and surface index made (see MeshLoader).
+                The renderer takes it over, bringing its rules and neighbourhood in line with starting_state.
+        """
+        self.colors_version = None  # Engine version the colour buffer was last filled from
+        self.paint_value = 1
+        self.history_reader = None  # Reader of the history being recorded, if any
+        self.history_file = None
+        self.scrub_index = None  # History record shown instead of the live state, if any
 
-        self.automata = automata_engine.Engine(mesh, tuple((int(i) for i in starting_state["on_rule"])), tuple((int(i) for i in starting_state["off_rule"])))
-        self.automata.make_projection_map()
+        self.automata = automata
+        on_rule, off_rule = tuple((int(i) for i in starting_state["on_rule"])), tuple((int(i) for i in starting_state["off_rule"]))
+        if automata.neighbourhood != starting_state["neighbourhood"]:  # Changed while the mesh was loading
+            automata.set_neighbourhood(starting_state["neighbourhood"])
+        if (automata.on_rule, automata.off_rule) != (on_rule, off_rule):
+            automata.set_rule(on_rule, off_rule)
         self.projection_map = self.automata.get_projection_map()
+        self._create_buffers(automata.mesh)
 
         self.camera = OrbitalCamera()
         self.camera.setup_camera_view(display_size[0], display_size[1])
         glEnable(GL_DEPTH_TEST)
 
+        # Only the worker touches the engine's state from here on, the renderer just reads its geometry
+        self.worker = SimulationWorker(self.automata, starting_state["delay"], starting_state["draw_mode"])
+        self.set_recording(starting_state["history"])
+        self.update_state(starting_changes, starting_state)
+        self.worker.start()
+
+    def _create_buffers(self, mesh):
+        """Uploads the 3D and projected triangle positions and the wireframe indices once."""
+        num_cells = len(mesh)
+        mesh_positions = mesh.get_triangles().astype(np.float32).reshape(-1, 3)
+        projected_positions = np.zeros((num_cells * 3, 3), dtype=np.float32)
+        projected_positions[:, :2] = self.projection_map.reshape(-1, 2)
+        outline_indices = (np.arange(num_cells, dtype=np.uint32)[:, None] * 3 + TRIANGLE_OUTLINE).ravel()
+
+        self.vertex_count = num_cells * 3
+        self.outline_index_count = len(outline_indices)
+        self.mesh_buffer, self.projection_buffer, self.color_buffer, self.outline_buffer = glGenBuffers(4)
+        self._upload(GL_ARRAY_BUFFER, self.mesh_buffer, mesh_positions, GL_STATIC_DRAW)
+        self._upload(GL_ARRAY_BUFFER, self.projection_buffer, projected_positions, GL_STATIC_DRAW)
+        self._upload(GL_ARRAY_BUFFER, self.color_buffer, np.zeros_like(mesh_positions), GL_DYNAMIC_DRAW)
+        self._upload(GL_ELEMENT_ARRAY_BUFFER, self.outline_buffer, outline_indices, GL_STATIC_DRAW)
+
+    @staticmethod
+    def _upload(target, buffer, data: np.ndarray, usage):
+        glBindBuffer(target, buffer)
+        glBufferData(target, data.nbytes, data, usage)
+        glBindBuffer(target, 0)
+
+    def delete(self):
+        """Stops the simulation worker and frees the GPU buffers, call before dropping the renderer."""
+        self.worker.stop()
+        if self.history_reader is not None:
+            self.history_reader.close()
+            self.automata.record_history(None)
+            self._remove_history_file(self.history_file)
+        glDeleteBuffers(4, [self.mesh_buffer, self.projection_buffer, self.color_buffer, self.outline_buffer])
+
     def render(self):
-        """Updates the automaton if necessary and draws the mesh."""
+        """Draws the mesh with the latest generation the worker has finished."""
         self.camera.apply_view()
-        current_time = time.time() # If we have waited the interval then update the automata
-        if current_time - self.last_update_time >= self.automata_update_interval and not self.draw_mode:
-            self.automata.calc_next_state()
-            self.automata.update_state()
-            self.last_update_time = current_time
         self.draw()
 
+    def _update_colors(self):
+        """Refills the colour buffer if the cell values or colours changed since it was last filled."""
+        if self.scrub_index is not None:
+            version = ("history", self.scrub_index)
+            if self.colors_version == version:
+                return
+            colors = cell_colors(self.history_reader.state(self.scrub_index), self.off_color, self.on_color)
+        else:
+            with self.worker.latest() as (values, version):
+                if self.colors_version == version:
+                    return
+                colors = cell_colors(values, self.off_color, self.on_color)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, colors.nbytes, colors)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.colors_version = version
+
     def draw(self):
         """Draws automaton mesh as triangles."""
-        glBegin(GL_TRIANGLES)
-        for face in self.automata.get_cells():
-            color = self.off_color if face.value == 0 else self.on_color
-            glColor3f(*color)
-            verts = face.get_verts() if not self.project else map(lambda vec: Vector3(vec.x, vec.y, 0), self.projection_map[face])
-            for vertex in verts:
-                glVertex3fv((vertex.x, vertex.y, vertex.z))
-        glEnd()
-
-        if not self.draw_mode: return
-        glDisable(GL_DEPTH_TEST)
-        for face in self.automata.get_cells():
+        self._update_colors()
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.projection_buffer if self.project else self.mesh_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(3, GL_FLOAT, 0, None)
+        outlined_surface = self.draw_mode and not self.project
+        if outlined_surface:  # Push the faces back so their outlines pass the depth test
+            glEnable(GL_POLYGON_OFFSET_FILL)
+            glPolygonOffset(1, 1)
+        glDrawArrays(GL_TRIANGLES, 0, self.vertex_count)
+        glDisable(GL_POLYGON_OFFSET_FILL)
+        glDisableClientState(GL_COLOR_ARRAY)
+
+        if self.draw_mode:
+            if self.project:
+                glDisable(GL_DEPTH_TEST)
             glLineWidth(1.5)
-            glBegin(GL_LINE_LOOP)
             glColor3f(1, 0, 0)
-            for vertex in map(lambda vec: Vector3(vec.x, vec.y, 0), self.projection_map[face]):
-                glVertex3fv((vertex.x, vertex.y, vertex.z))
-            glEnd()
-        glEnable(GL_DEPTH_TEST)
+            glBindBuffer(GL_ARRAY_BUFFER, self.projection_buffer if self.project else self.mesh_buffer)
+            glVertexPointer(3, GL_FLOAT, 0, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.outline_buffer)
+            glDrawElements(GL_LINES, self.outline_index_count, GL_UNSIGNED_INT, None)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glEnable(GL_DEPTH_TEST)
+
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
 
     def update_state(self, changes, state):
         """Applies control panel state changes to the renderer.
@@ -65,17 +145,66 @@ class CellularAutomataRenderer:
         if changes["project"]:
             self.camera.reset_orientation()
         if changes["draw_mode"] and state["draw_mode"]: # If draw mode turned on then clear values
-            self.automata.clear_values()
+            self.worker.clear_values()
+        if changes["off_color"] or changes["on_color"]:
+            self.colors_version = None
 
         self.project = state["project"]
-        self.automata_update_interval = state["delay"]
         self.off_color = state["off_color"]
         self.on_color = state["on_color"]
         self.draw_mode = state["draw_mode"]
+        if changes["history"]:
+            self.set_recording(state["history"])
+        recorded = len(self.history_reader) if self.history_reader is not None else 0
+        self.scrub_index = min(state["history_index"], recorded - 1) if state["scrubbing"] and recorded else None
+        self.worker.interval = state["delay"]
+        self.worker.set_turbo(state["turbo"])
+        if changes["jump"]:
+            if self.worker.jump_target is None:
+                self.worker.jump_to(state["jump_target"])
+            else:
+                self.worker.cancel_jump()
+        self.worker.set_paused(self.draw_mode or self.scrub_index is not None)
+
+    def set_recording(self, recording: bool):
+        """Starts or stops recording every generation to a temporary history file, which can then be scrubbed through."""
+        if recording == (self.history_reader is not None):
+            return
+        if recording:
+            handle, self.history_file = tempfile.mkstemp(prefix="surface-automata-", suffix=".hist")
+            os.close(handle)
+            recorder = HistoryRecorder(self.history_file, self.automata.num_cells)
+            self.history_reader = HistoryReader(self.history_file)
+            self.worker.submit(lambda engine: engine.record_history(recorder))
+        else:
+            self.history_reader.close()
+            self.history_reader = self.scrub_index = None
+            history_file = self.history_file
+            def stop(engine):
+                engine.record_history(None)
+                self._remove_history_file(history_file)
+            self.worker.submit(stop)
 
-    def handle_mouse_motion(self, rel: tuple[int, int], buttons: tuple[bool, bool, bool]):
+    @staticmethod
+    def _remove_history_file(file_name):
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass  # Left in the temporary directory
+
+    def set_rule(self, on_rule, off_rule):
+        """Sends a rule change to the simulation worker."""
+        self.worker.set_rule(on_rule, off_rule)
+
+    def set_neighbourhood(self, neighbourhood):
+        """Sends a neighbourhood change to the simulation worker."""
+        self.worker.submit(lambda engine: engine.set_neighbourhood(neighbourhood))
+
+    def handle_mouse_motion(self, pos: tuple[int, int], rel: tuple[int, int], buttons: tuple[bool, bool, bool]):
         """Handles mouse motion"""
-        if buttons[0] and not self.project:  # Left click
+        if buttons[0] and self.draw_mode and self.scrub_index is None:  # Left drag paints in draw mode
+            self._paint_stroke(pos, rel)
+        elif (buttons[0] or buttons[2]) and not self.project:  # Left drag, or right drag while painting
             self.camera.rotate(rel[0], rel[1])
 
     def handle_mouse_wheel(self, y):
@@ -83,8 +212,26 @@ class CellularAutomataRenderer:
         self.camera.zoom(y * self.ZOOM_SENSTIVITY)
 
     def handle_mouse_press(self, event):
-        if not self.draw_mode: return
+        if not self.draw_mode or self.scrub_index is not None: return
         if event.button == 1:
-            x, y, z = self.camera.screen_coords_to_world_coords(event.pos[0], event.pos[1])
-            cell = self.automata.get_cell_at_pos_in_proj(Vector2(x, y))
-            if cell: cell.value = not cell.value
+            index, = self._cells_at(np.array([event.pos]))
+            if index >= 0:
+                with self.worker.latest() as (values, _):
+                    self.paint_value = 1 - int(values[index])  # Dragging from here paints this value
+                self.worker.set_values(np.array([index]), self.paint_value)
+
+    def _paint_stroke(self, pos: tuple[int, int], rel: tuple[int, int]):
+        """Sets every cell under the mouse path since the last motion event to the paint value."""
+        samples = max(abs(rel[0]), abs(rel[1])) // self.BRUSH_SAMPLE_SPACING + 1
+        t = np.linspace(0, 1, samples + 1)[:, None]
+        screen_points = np.array(pos) - np.array(rel) * (1 - t)
+        indices = self._cells_at(screen_points)
+        indices = indices[indices >= 0]
+        if len(indices):
+            self.worker.set_values(indices, self.paint_value)
+
+    def _cells_at(self, screen_points: np.ndarray) -> np.ndarray:
+        """Returns the cell under each screen point, in the projection or on the 3D surface, -1 where there is none."""
+        if self.project:
+            return self.automata.get_cell_indices_at_pos_in_proj(self.camera.screen_coords_to_plane(screen_points))
+        return self.automata.get_cell_indices_on_rays(*self.camera.screen_rays(screen_points))
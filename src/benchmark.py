@@ -0,0 +1,207 @@
+"""Times the main stages of the automaton over the shipped icospheres and larger generated ones.
+
+Each mesh is loaded and validated, given an engine (which builds the edge adjacency), unfolded into the
+projection and stepped, and the projection is used for cell lookups. Results are written as JSON and compared
+against a baseline recorded on the same machine, so that slowdowns show up. Timings depend on the machine, so
+no baseline is shipped: without one the run fails rather than passing unchecked.
+
+Usage:
+    python benchmark.py --output benchmark.json
+    python benchmark.py --save-baseline          # Record the current numbers as the baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from helper_functions import load_and_validate_obj, cell_colors
+from automata_engine import Engine
+from mesh import Mesh
+
+FORMAT_VERSION = 1
+ASSET_MESHES = ["Icosphere_320_faces.obj", "Icosphere_1280_faces.obj", "Icosphere_5120_faces.obj"]
+DEFAULT_MAX_FACES = 1_400_000  # Largest generated icosphere, each subdivision multiplies the faces by 4
+ON_RULE = (0, 1, 1, 0)
+OFF_RULE = (0, 0, 1, 1)
+SEED = 0
+PICK_QUERIES = 2000
+DEFAULT_TOLERANCE = 0.25  # Relative slowdown reported as a regression
+MIN_TIMING_S = 0.05
+
+# Metric name to whether a larger value is better
+METRICS = {
+    "load_s": False,
+    "engine_init_s": False,
+    "projection_s": False,
+    "generations_per_s": True,
+    "picks_per_s": True,
+    "color_fill_s": False,
+}
+
+
+def best_time(function: Callable[[], object], repeats: int) -> float:
+    """Returns the fastest of `repeats` timings of a call, in seconds.
+    Quick calls are timed in batches of at least MIN_TIMING_S, so timer resolution and noise do not dominate."""
+    number = 1
+    while True:
+        elapsed = _time_calls(function, number)
+        if elapsed >= MIN_TIMING_S:
+            break
+        number *= 10
+    return min([elapsed] + [_time_calls(function, number) for _ in range(repeats - 1)]) / number
+
+
+def _time_calls(function: Callable[[], object], number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        function()
+    return time.perf_counter() - start
+
+
+def subdivide(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Splits every triangle of a unit sphere mesh into four, pushing the new vertices out onto the sphere."""
+    edges = np.sort(faces[:, [[0, 1], [1, 2], [2, 0]]].reshape(-1, 2), axis=1)
+    unique_edges, edge_of = np.unique(edges, axis=0, return_inverse=True)
+    midpoints = vertices[unique_edges].mean(axis=1)
+    midpoints /= np.linalg.norm(midpoints, axis=1)[:, None]
+    ab, bc, ca = (edge_of.reshape(-1, 3) + len(vertices)).T
+    a, b, c = faces.T
+    new_faces = np.concatenate([np.stack(corners, axis=1) for corners in ((a, ab, ca), (ab, b, bc), (ca, bc, c), (ab, bc, ca))])
+    return np.vstack([vertices, midpoints]), new_faces
+
+
+def write_obj(file_name: str, vertices: np.ndarray, faces: np.ndarray):
+    with open(file_name, "w") as file:
+        np.savetxt(file, vertices, fmt="v %.8f %.8f %.8f")
+        np.savetxt(file, faces + 1, fmt="f %d %d %d")
+
+
+def generated_meshes(seed_file: str, max_faces: int, out_dir: str) -> Iterator[Tuple[str, str]]:
+    """Writes ever finer subdivisions of `seed_file` into `out_dir`, yielding (name, path) for each one up to max_faces."""
+    mesh = load_and_validate_obj(seed_file)
+    vertices, faces = mesh.vertices / np.linalg.norm(mesh.vertices, axis=1)[:, None], mesh.faces
+    while True:
+        vertices, faces = subdivide(vertices, faces)
+        if len(faces) > max_faces:
+            return
+        name = f"Icosphere_{len(faces)}_faces (generated)"
+        path = os.path.join(out_dir, f"icosphere_{len(faces)}.obj")
+        write_obj(path, vertices, faces)
+        yield name, path
+
+
+def benchmark_mesh(file_name: str, repeats: int, generations: int) -> Dict[str, float]:
+    """Times each stage on one mesh, see METRICS for what is measured."""
+    results: Dict[str, float] = {}
+    results["load_s"] = best_time(lambda: load_and_validate_obj(file_name), repeats)
+    loaded = load_and_validate_obj(file_name)
+    results["faces"] = len(loaded)
+
+    # Fresh meshes so nothing memoized by an earlier stage is reused
+    results["engine_init_s"] = best_time(lambda: Engine(Mesh(loaded.vertices, loaded.faces), ON_RULE, OFF_RULE, seed=SEED), repeats)
+    def project():
+        engine = Engine(Mesh(loaded.vertices, loaded.faces, edge_adjacency=loaded.edge_adjacency()), ON_RULE, OFF_RULE, seed=SEED)
+        engine.make_projection_map()
+        return engine
+    results["projection_s"] = best_time(project, repeats)
+
+    engine = project()
+    results["backend"] = engine.backend.name
+    def run():
+        # Steps without cycle fast-forwarding, which would skip the work being measured
+        for _ in range(generations):
+            engine.calc_next_state()
+            engine.update_state()
+    results["generations_per_s"] = generations / best_time(run, 1)
+
+    projection = engine.get_projection_map().reshape(-1, 2)
+    points = np.random.default_rng(SEED).uniform(projection.min(axis=0), projection.max(axis=0), (PICK_QUERIES, 2))
+    engine.get_cell_at_pos_in_proj(points[0])  # Creates the cell objects outside the timing
+    results["picks_per_s"] = PICK_QUERIES / best_time(lambda: [engine.get_cell_at_pos_in_proj(p) for p in points], repeats)
+
+    results["color_fill_s"] = best_time(lambda: cell_colors(engine.values, (0, 0, 0), (1, 1, 1)), repeats)
+    return results
+
+
+def run_benchmarks(max_faces: int = DEFAULT_MAX_FACES, repeats: int = 3, generations: int = 100, log: Callable[[str], None] = print) -> Dict[str, object]:
+    """
+    Benchmarks the shipped icospheres and generated ones up to max_faces.
+    Args:
+        max_faces (int): Largest generated mesh, 0 for the shipped assets only.
+        repeats (int): Timed runs per stage, the fastest is kept.
+        generations (int): Generations stepped for the generations per second figure.
+        log (Callable[[str], None]): Called with a progress line per mesh.
+    Returns:
+        Dict[str, object]: The report, environment details plus the metrics of every mesh.
+    """
+    assets_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets')
+    report = {"format_version": FORMAT_VERSION,
+              "environment": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(), "processor": platform.processor()},
+              "settings": {"repeats": repeats, "generations": generations},
+              "meshes": {}}
+    meshes: List[Tuple[str, str]] = [(name, os.path.join(assets_root, name)) for name in ASSET_MESHES]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, path in meshes + list(generated_meshes(meshes[-1][1], max_faces, temp_dir)):
+            report["meshes"][name] = results = benchmark_mesh(path, repeats, generations)
+            log(f"{name}: " + ", ".join(f"{metric} {results[metric]:.4g}" for metric in METRICS))
+    return report
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Returns a description of every metric that is more than `tolerance` worse than in the baseline."""
+    regressions = []
+    for name, results in report["meshes"].items():
+        old_results = baseline["meshes"].get(name)
+        if old_results is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            new, old = results.get(metric), old_results.get(metric)
+            if not new or not old:
+                continue
+            slowdown = old / new if higher_is_better else new / old
+            if slowdown > 1 + tolerance:
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} ({slowdown:.2f}x slower)")
+    return regressions
+
+
+def main():
+    project_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+    parser = argparse.ArgumentParser(description="Benchmark mesh loading, adjacency, projection, stepping and picking.")
+    parser.add_argument("--max-faces", type=int, default=DEFAULT_MAX_FACES, help="largest generated icosphere, 0 to only use the shipped assets")
+    parser.add_argument("--repeats", type=int, default=3, help="timed runs per stage, the fastest is kept")
+    parser.add_argument("-n", "--generations", type=int, default=100, help="generations stepped per mesh")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="where to write the results (.json)")
+    parser.add_argument("--baseline", default=os.path.join(project_root, "benchmark_baseline.json"), help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.max_faces, args.repeats, args.generations)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}")
+    else:
+        sys.exit(f"No baseline at {args.baseline} to check for regressions, run with --save-baseline to record one on this machine")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
-from OpenGL.GL import *
-from OpenGL.GLU import *
-from pygame import Vector3
+from typing import Tuple
+import numpy as np
 import math
+# OpenGL is imported by the methods that load matrices into it, so the NumPy maths works without a GL library (e.g. for the exporter)
 
 class Camera:
     def __init__(self):
@@ -9,30 +9,69 @@ class Camera:
         self.z_near = 0.1
         self.z_far = 50.0
         self.distance = -5
+        self.width, self.height = 1, 1  # Viewport size, set by setup_camera_view
 
     def setup_camera_view(self, width: int, height: int) -> None:
         """Applies the perspective projection based on current camera settings."""
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(self.fov, width / height, self.z_near, self.z_far)
-        glMatrixMode(GL_MODELVIEW)
+        from OpenGL import GL, GLU
+        self.width, self.height = width, height
+        GL.glMatrixMode(GL.GL_PROJECTION)
+        GL.glLoadIdentity()
+        GLU.gluPerspective(self.fov, width / height, self.z_near, self.z_far)
+        GL.glMatrixMode(GL.GL_MODELVIEW)
         self.reset_orientation()
 
     def reset_orientation(self) -> None:
         """Resets the view."""
-        glLoadIdentity()
-        glTranslatef(0.0, 0.0, self.distance)
+        from OpenGL import GL
+        GL.glLoadIdentity()
+        GL.glTranslatef(0.0, 0.0, self.distance)
 
-    def screen_coords_to_world_coords(self, x, y, z=0.0):
-        modelview = glGetDoublev(GL_MODELVIEW_MATRIX)
-        projection = glGetDoublev(GL_PROJECTION_MATRIX)
-        viewport = glGetIntegerv(GL_VIEWPORT)
+    def projection_matrix(self, width: int, height: int) -> np.ndarray:
+        """Returns the 4x4 perspective matrix setup_camera_view loads, for rendering without OpenGL."""
+        f = 1 / math.tan(math.radians(self.fov) / 2)
+        near, far = self.z_near, self.z_far
+        return np.array([[f * height / width, 0, 0, 0],
+                         [0, f, 0, 0],
+                         [0, 0, (far + near) / (near - far), 2 * far * near / (near - far)],
+                         [0, 0, -1, 0]])
 
-        real_y = viewport[3] - y - 1 # Flip y coordinate because OpenGL's origin is bottom-left
-        z_depth = glReadPixels(x, real_y, 1, 1, GL_DEPTH_COMPONENT, GL_FLOAT)
-        z = float(z_depth[0][0])
-        x, y, z = gluUnProject(x, real_y, z, modelview, projection, viewport)
-        return x, y, z
+    def view_matrix(self) -> np.ndarray:
+        """Returns the 4x4 modelview matrix of the reset view."""
+        view = np.identity(4)
+        view[2, 3] = self.distance
+        return view
+
+    def screen_rays(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the view rays through screen points, from the camera's own matrices so nothing is read back from OpenGL.
+        Args:
+            points (np.ndarray): (N, 2) screen positions in pixels, origin top-left.
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (N, 3) ray starts on the near plane and (N, 3) directions reaching the far plane.
+        """
+        inverse = np.linalg.inv(self.projection_matrix(self.width, self.height) @ self.view_matrix())
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        ndc_x = 2 * points[:, 0] / self.width - 1
+        ndc_y = 2 * (self.height - points[:, 1] - 1) / self.height - 1
+        ends = []
+        for ndc_z in (-1, 1):  # Near and far plane
+            clip = np.stack([ndc_x, ndc_y, np.full_like(ndc_x, ndc_z), np.ones_like(ndc_x)])
+            world = inverse @ clip
+            ends.append((world[:3] / world[3]).T)
+        near, far = ends
+        return near, far - near
+
+    def screen_coords_to_plane(self, points: np.ndarray, plane_z: float = 0.0) -> np.ndarray:
+        """Maps screen points onto the world plane z = plane_z by intersecting their view rays with it.
+        Args:
+            points (np.ndarray): (N, 2) screen positions in pixels, origin top-left.
+            plane_z (float): Height of the plane in world space.
+        Returns:
+            np.ndarray: (N, 2) world (x, y) positions on the plane.
+        """
+        origins, directions = self.screen_rays(points)
+        t = (plane_z - origins[:, 2]) / directions[:, 2]
+        return (origins + directions * t[:, None])[:, :2]
     
 class OrbitalCamera(Camera):
     def __init__(self):
@@ -40,23 +79,40 @@ class OrbitalCamera(Camera):
         self.radius = 5.0
         self.azimuth = 0.0     # horizontal angle (theta/yaw)
         self.elevation = 0.0   # vertical angle (phi/pitch)
-        self.target = Vector3(0, 0, 0)
+        self.target = np.zeros(3)
 
     def apply_view(self) -> None:
-        x = self.radius * math.cos(self.elevation) * math.sin(self.azimuth)
-        y = self.radius * math.sin(self.elevation)
-        z = self.radius * math.cos(self.elevation) * math.cos(self.azimuth)
-
-        eye = Vector3(x, y, z) + self.target
+        from OpenGL import GL, GLU
+        eye = self.get_eye()
 
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
-        gluLookAt(
-            eye.x, eye.y, eye.z,
-            self.target.x, self.target.y, self.target.z,
+        GL.glMatrixMode(GL.GL_MODELVIEW)
+        GL.glLoadIdentity()
+        GLU.gluLookAt(
+            *eye,
+            *self.target,
             0, 1, 0
         )
 
+    def view_matrix(self) -> np.ndarray:
+        """Returns the 4x4 modelview matrix apply_view loads, for rendering without OpenGL."""
+        eye = self.get_eye()
+        target = np.asarray(self.target, dtype=np.float64)
+        forward = (target - eye) / np.linalg.norm(target - eye)
+        side = np.cross(forward, (0, 1, 0))
+        side /= np.linalg.norm(side)
+        up = np.cross(side, forward)
+        view = np.identity(4)
+        view[0, :3], view[1, :3], view[2, :3] = side, up, -forward
+        view[:3, 3] = -view[:3, :3] @ eye
+        return view
+
+    def get_eye(self) -> np.ndarray:
+        """Returns the camera position."""
+        x = self.radius * math.cos(self.elevation) * math.sin(self.azimuth)
+        y = self.radius * math.sin(self.elevation)
+        z = self.radius * math.cos(self.elevation) * math.cos(self.azimuth)
+        return np.array([x, y, z]) + self.target
+
     def rotate(self, delta_azimuth: float, delta_elevation: float) -> None:
         """Rotates the camera around the target"""
         self.azimuth += delta_azimuth * 0.01
@@ -1,17 +1,30 @@
 import pygame
-from pygame.locals import DOUBLEBUF, OPENGL, QUIT 
-from OpenGL.GL import *
-from OpenGL.GLU import *
 import imgui
 from imgui.integrations.pygame import PygameRenderer
 import re
 
-from typing import Dict, Any
+import numpy as np
+from typing import Dict, Any, Optional, TYPE_CHECKING
+from profiler import Profiler, STEP_PHASE, FRAME_PHASE
+from mesh import NEIGHBOURHOODS
+
+if TYPE_CHECKING:  # Annotations only, simulation_worker would load the engine before the window opens
+    from history import HistoryReader
+    from simulation_stats import StatsHistory
+    from mesh_loader import MeshLoader
+    from simulation_worker import SimulationWorker
+
+MAX_RULE_LENGTH = 32  # Entries past a cell's largest neighbour count are ignored, missing ones are 'off'
 
 class ControlPanel:
     """ImGui control panel for interacting with automaton parameters."""
-    def __init__(self):
+    def __init__(self, profiler: Optional[Profiler] = None):
         imgui.create_context()
+        self.profiler = profiler  # Source of the performance stats, the section is hidden without one
+        self.history: Optional["HistoryReader"] = None  # History being recorded, set by the app
+        self.stats: Optional["StatsHistory"] = None  # Stats of the running automaton, set by the app
+        self.loading: Optional["MeshLoader"] = None  # Mesh being loaded in the background, set by the app
+        self.simulation: Optional["SimulationWorker"] = None  # Worker stepping the automaton, set by the app
         self.imgui_renderer = PygameRenderer()
         imgui.get_io().ini_file_name = None
 
@@ -22,15 +35,31 @@ class ControlPanel:
                                          "change_mesh": False, 
                                          "draw_mode": False, 
                                          "on_rule": False, 
-                                         "off_rule": False}
+                                         "off_rule": False,
+                                         "neighbourhood": False,
+                                         "instrumentation": False,
+                                         "trace": False,
+                                         "history": False,
+                                         "scrubbing": False,
+                                         "history_index": False,
+                                         "turbo": False,
+                                         "jump": False}
         self.state: Dict[str, Any] = {"project": True, 
                                       "delay": 0.5, 
                                       "on_color": (1, 1, 1), 
                                       "off_color": (0, 0, 0), 
                                       "draw_mode": False, 
                                       "on_rule": "0110", 
-                                      "off_rule": "0011"}
-        self.rule_regex: str =  r'^[01]{4}$'
+                                      "off_rule": "0011",
+                                      "neighbourhood": "edge",
+                                      "instrumentation": False,
+                                      "trace": False,
+                                      "history": False,
+                                      "scrubbing": False,
+                                      "history_index": 0,
+                                      "turbo": False,
+                                      "jump_target": 100000}
+        self.rule_regex: str =  r'^[01]{1,%d}$' % MAX_RULE_LENGTH
 
     def get_changes(self) -> Dict[str, bool]:
         """Returns flags indicating which control values changed."""
@@ -47,34 +76,123 @@ class ControlPanel:
     def draw(self):
         """Builds, renders and gets states of the ImGui UI window with control widgets."""
         imgui.begin("Controls")
+        self.changes["on_rule"] = self.changes["off_rule"] = False  # Only set by the rule popup on the frame it is edited
         self.changes["draw_mode"], self.state["draw_mode"] = imgui.checkbox("Enable Draw Mode", self.state["draw_mode"])
-        if self.state["draw_mode"]:
-            self.changes["project"], self.state["project"] = self.changes["draw_mode"], True
-            imgui.checkbox("Enable Projection", True)
-        else:
-            self.changes["project"], self.state["project"] = imgui.checkbox("Enable Projection", self.state["project"])
+        self.changes["project"], self.state["project"] = imgui.checkbox("Enable Projection", self.state["project"])
         
         self.changes["delay"], self.state["delay"] = imgui.slider_float("Delay", self.state["delay"], 0.0, 1.5)
         self.changes["off_color"], self.state["off_color"] = imgui.color_edit3("Edit off color", *self.state["off_color"], flags=imgui.COLOR_EDIT_NO_INPUTS)
         self.changes["on_color"], self.state["on_color"] = imgui.color_edit3("Edit on color", *self.state["on_color"], flags=imgui.COLOR_EDIT_NO_INPUTS)
         self.changes["change_mesh"] = imgui.button("Change mesh")
+        if self.loading is not None:
+            progress = self.loading.progress
+            imgui.same_line()
+            imgui.text(f"Loading {progress.file_name}")
+            imgui.progress_bar(progress.fraction, (0, 0), f"{progress.stage}...")
+        neighbourhood_changed, neighbourhood = imgui.combo("Neighbours", NEIGHBOURHOODS.index(self.state["neighbourhood"]), ["Shared edge", "Shared vertex"])
+        self.changes["neighbourhood"], self.state["neighbourhood"] = neighbourhood_changed, NEIGHBOURHOODS[neighbourhood]
         if imgui.button("Change rule"):
             imgui.open_popup("my_popup")
         if imgui.begin_popup("my_popup"):
             self._change_rule_pop_up()
             imgui.end_popup()
+        self._fast_forward_section()
+        self._history_section()
+        if self.stats is not None:
+            self._stats_section()
+        if self.profiler is not None:
+            self._performance_section()
         imgui.end()
 
+    def _fast_forward_section(self):
+        """Collapsible section to step as fast as possible, or jump ahead to a generation without drawing the ones between."""
+        expanded, _ = imgui.collapsing_header("Fast forward")
+        self.changes["jump"] = False
+        if not expanded:
+            self.changes["turbo"] = False
+            return
+        self.changes["turbo"], self.state["turbo"] = imgui.checkbox("Turbo (ignores delay)", self.state["turbo"])
+        imgui.push_item_width(120)
+        _, self.state["jump_target"] = imgui.input_int("##jump_target", self.state["jump_target"], step=0)
+        imgui.pop_item_width()
+        self.state["jump_target"] = max(self.state["jump_target"], 0)
+        imgui.same_line()
+        jumping = self.simulation is not None and self.simulation.jump_target is not None
+        self.changes["jump"] = imgui.button("Cancel jump" if jumping else "Jump to generation")
+        if self.simulation is None:
+            return
+        if jumping and self.stats is not None and len(self.stats):
+            imgui.text(f"Jumping: generation {self.stats.latest().generation:,} of {self.simulation.jump_target:,}")
+        elif self.simulation.last_jump is not None:
+            jump = self.simulation.last_jump
+            imgui.text(f"Last jump: {jump.generations:,} generations in {jump.seconds:.2f} s ({jump.generations_per_s:,.0f}/s)")
+        imgui.text(f"Generations/s: {self.simulation.generations_per_s:,.1f}")
+
+    def _history_section(self):
+        """Collapsible section to record the automaton's history and scrub back through it."""
+        expanded, _ = imgui.collapsing_header("History")
+        if not expanded:
+            self.changes["history"] = self.changes["scrubbing"] = self.changes["history_index"] = False
+            return
+        self.changes["history"], self.state["history"] = imgui.checkbox("Record history", self.state["history"])
+        self.changes["history_index"] = False
+        recorded = len(self.history) if self.state["history"] and self.history is not None else 0
+        if not recorded:
+            self.changes["scrubbing"] = self.state["scrubbing"]  # Recording stopped, so scrubbing does too
+            self.state["scrubbing"] = False
+            return
+        imgui.text(f"Recorded states: {recorded}")
+        self.changes["scrubbing"], self.state["scrubbing"] = imgui.checkbox("Scrub timeline (pauses)", self.state["scrubbing"])
+        if self.changes["scrubbing"]:
+            self.state["history_index"] = recorded - 1  # Start from where the simulation is
+        if self.state["scrubbing"]:
+            self.changes["history_index"], self.state["history_index"] = imgui.slider_int("##history_index", self.state["history_index"], 0, recorded - 1)
+            imgui.same_line()
+            imgui.text(f"Generation {self.history.generation(self.state['history_index'])}")
+
+    def _stats_section(self):
+        """Collapsible section with the latest generation's counts and sparklines of the recent ones."""
+        expanded, _ = imgui.collapsing_header("Statistics")
+        latest = self.stats.latest()
+        if not expanded or latest is None:
+            return
+        imgui.text(f"Generation {latest.generation}: population {latest.population:,}")
+        imgui.text(f"Births {latest.births:,}, deaths {latest.deaths:,}, changed {100 * latest.changed_fraction:.2f}%")
+        imgui.plot_lines("Population", self.stats.series("population").astype(np.float32), graph_size=(0, 50))
+        imgui.plot_lines("Changed", self.stats.series("changed_fraction").astype(np.float32), scale_min=0, graph_size=(0, 50))
+
+    def _performance_section(self):
+        """Collapsible section to turn on instrumentation, showing the rolling timings and rates it collects."""
+        expanded, _ = imgui.collapsing_header("Performance")
+        if not expanded:
+            self.changes["instrumentation"] = self.changes["trace"] = False
+            return
+        self.changes["instrumentation"], self.state["instrumentation"] = imgui.checkbox("Enable instrumentation", self.state["instrumentation"])
+        if not self.state["instrumentation"]:
+            self.changes["trace"] = self.state["trace"]  # A running trace is written out when instrumentation is turned off
+            self.state["trace"] = False
+            return
+        self.changes["trace"], self.state["trace"] = imgui.checkbox("Record trace", self.state["trace"])
+
+        stats = self.profiler.stats()
+        step, frame = stats.get(STEP_PHASE), stats.get(FRAME_PHASE)
+        imgui.text(f"FPS: {frame.calls_per_s if frame else 0:.1f}")
+        # Stepped calls stop once a cycle is replayed, so generations come from the worker rather than the step phase
+        imgui.text(f"Generations/s: {self.simulation.generations_per_s if self.simulation is not None else 0:,.1f}")
+        imgui.text(f"Cells evaluated/s: {step.units_per_s if step else 0:,.0f}")
+        for phase, phase_stats in sorted(stats.items()):
+            imgui.text(f"{phase}: {phase_stats.mean_ms:.2f} ms (max {phase_stats.max_ms:.2f})")
+
     def _change_rule_pop_up(self):
         """Popup widget to enter new on/off rules using binary strings."""
         imgui.align_text_to_frame_padding()
-        imgui.push_item_width(40)
+        imgui.push_item_width(160)
         imgui.text("On Rule: ")
         imgui.same_line()
-        on_rule_changed, new_on_rule = imgui.input_text("##on_rule", self.state["on_rule"], 5) 
+        on_rule_changed, new_on_rule = imgui.input_text("##on_rule", self.state["on_rule"], MAX_RULE_LENGTH + 1) 
         imgui.text("Off Rule:")
         imgui.same_line() 
-        off_rule_changed, new_off_rule = imgui.input_text("##off_rule", self.state["off_rule"], 5) 
+        off_rule_changed, new_off_rule = imgui.input_text("##off_rule", self.state["off_rule"], MAX_RULE_LENGTH + 1) 
         imgui.pop_item_width()
 
         if on_rule_changed:
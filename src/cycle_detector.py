@@ -0,0 +1,73 @@
+from collections import deque
+from typing import NamedTuple, Optional
+import numpy as np
+
+HISTORY_LENGTH = 4096  # Longest period that can be detected
+MAX_REPLAY_BYTES = 64 << 20  # Largest cycle, as packed states, that is kept for replay
+HASH_SEED = 0x5EED
+
+
+class CycleInfo(NamedTuple):
+    """A repeating sequence of generations."""
+    transient: int  # Generation at which the cycle is first entered
+    period: int  # Number of generations in one cycle, 1 for a still life
+
+
+class CycleDetector:
+    """
+    Detects when an automaton returns to an earlier state.
+    Each generation is hashed by XORing a random 64 bit key per 'on' cell (Zobrist hashing), so the hash is
+    updated from just the cells that changed. A bounded history of hashes finds repeats with period up to
+    HISTORY_LENGTH. Once a cycle is found its states are recorded over one period so they can be replayed.
+    """
+
+    def __init__(self, num_cells: int, history_length: int = HISTORY_LENGTH):
+        self.cell_keys = np.random.default_rng(HASH_SEED).integers(0, np.iinfo(np.uint64).max, num_cells, dtype=np.uint64, endpoint=True)
+        self.history_length = history_length
+        self.state_bytes = -(-num_cells // 8)
+
+    def reset(self, values: np.ndarray, generation: int):
+        """Forgets all history and starts again from the given state, e.g. after an edit or rule change."""
+        self.hash = int(np.bitwise_xor.reduce(self.cell_keys[values.astype(bool)]))
+        self.seen = {self.hash: generation}  # Hash to the generation it was seen at
+        self.history = deque([self.hash])
+        self.cycle: Optional[CycleInfo] = None
+        self.cycle_start = generation
+        self.cycle_states = []  # Packed states of one full period, starting at cycle_start
+        self.replayable = False
+
+    def record(self, changed: np.ndarray, values: np.ndarray, generation: int):
+        """
+        Updates the hash after a step and checks it against the history.
+        Args:
+            changed (np.ndarray): Indices of the cells whose value changed in the step.
+            values (np.ndarray): The new cell values.
+            generation (int): The generation `values` belongs to.
+        """
+        self.hash ^= int(np.bitwise_xor.reduce(self.cell_keys[changed]))
+
+        if self.cycle is not None:
+            if not self.replayable and self.cycle_states is not None:
+                self.cycle_states.append(np.packbits(values))
+                self.replayable = len(self.cycle_states) == self.cycle.period
+            return
+
+        first_seen = self.seen.get(self.hash)
+        if first_seen is not None:
+            self.cycle = CycleInfo(first_seen, generation - first_seen)
+            self.cycle_start = generation
+            if self.cycle.period * self.state_bytes <= MAX_REPLAY_BYTES:
+                self.cycle_states = [np.packbits(values)]
+                self.replayable = self.cycle.period == 1
+            else:
+                self.cycle_states = None  # Too big to keep, the cycle is still reported
+            return
+
+        self.seen[self.hash] = generation
+        self.history.append(self.hash)
+        if len(self.history) > self.history_length:
+            del self.seen[self.history.popleft()]
+
+    def state_at(self, generation: int) -> np.ndarray:
+        """Returns the packed state of any generation after the recorded cycle start, only valid once replayable."""
+        return self.cycle_states[(generation - self.cycle_start) % self.cycle.period]
@@ -0,0 +1,109 @@
+from typing import Tuple, Sequence
+import numpy as np
+
+from automata_engine import INITIAL_ON_CHANCE, neighbour_table, compile_rule_table
+from mesh import Mesh
+
+WORD_BITS = 64
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+class EnsembleEngine:
+    """
+    Runs many independent simulations of the same mesh and rules at once.
+    Run r lives in bit r % 64 of word r // 64 of every cell, so neighbour counting and the
+    rule lookup are done with bitwise operations for 64 runs per machine word.
+    Run r starts from the same state as `Engine(mesh, seed=seeds[r])` and evolves identically.
+    """
+
+    def __init__(self, mesh: Mesh, seeds: Sequence[int], on_rule: Tuple[int, ...] = (0, 1, 1, 0), off_rule: Tuple[int, ...] = (0, 1, 1, 0), neighbourhood: str = "edge"):
+        self.num_cells = num_cells = len(mesh)
+        self.seeds = list(seeds)
+        self.runs = len(self.seeds)
+        self.num_words = -(-self.runs // WORD_BITS)
+
+        self.neighbour_indices = neighbour_table(mesh, neighbourhood)
+        self.count_bits = len(self.neighbour_indices).bit_length()  # Bits needed to hold any neighbour count
+
+        # Valid run bits in each word, so unused bits of the last word stay off
+        run_bits = np.zeros(self.num_words * WORD_BITS, dtype=np.uint8)
+        run_bits[:self.runs] = 1
+        self._run_mask = np.packbits(run_bits, bitorder="little").view(np.uint64)
+
+        # Packed cell states, the extra trailing row is always 0 and is what padded neighbour entries point at
+        self._state = np.zeros((num_cells + 1, self.num_words), dtype=np.uint64)
+        initial = np.array([np.random.default_rng(seed).random(num_cells) < INITIAL_ON_CHANCE for seed in self.seeds])
+        self.set_run_states(initial)
+        self.set_rule(on_rule, off_rule)
+
+        self.generation = 0
+        self.populations = [self.get_populations()]
+
+    def set_rule(self, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...]):
+        """Updates the rule sets used for automaton transitions, see compile_rule_table."""
+        self.on_rule, self.off_rule = on_rule, off_rule
+        self.rule_table = compile_rule_table(on_rule, off_rule, len(self.neighbour_indices))
+
+    def set_run_states(self, states: np.ndarray):
+        """Replaces the state of every run from a (runs, num_cells) array of cell values."""
+        bits = np.zeros((self.num_cells, self.num_words * WORD_BITS), dtype=np.uint8)
+        bits[:, :self.runs] = np.asarray(states, dtype=bool).T
+        self._state[:self.num_cells] = np.packbits(bits, axis=1, bitorder="little").view(np.uint64)
+
+    def get_run_states(self) -> np.ndarray:
+        """Returns the (runs, num_cells) array of current cell values for every run."""
+        bits = np.unpackbits(self._state[:self.num_cells].view(np.uint8), axis=1, bitorder="little")
+        return np.ascontiguousarray(bits[:, :self.runs].T)
+
+    def get_populations(self) -> np.ndarray:
+        """Returns the number of 'on' cells in each run."""
+        bits = np.unpackbits(self._state[:self.num_cells].view(np.uint8), axis=1, bitorder="little")
+        return bits.sum(axis=0, dtype=np.int64)[:self.runs]
+
+    def step(self):
+        """Advances every run by one generation."""
+        state = self._state
+        current = state[:self.num_cells]
+
+        # Bit-sliced ripple carry adder, counter[i] holds bit i of every cell's 'on' neighbour count
+        counter = [np.zeros_like(current) for _ in range(self.count_bits)]
+        for column in self.neighbour_indices:
+            carry = state[column]
+            for i in range(self.count_bits):
+                counter[i], carry = counter[i] ^ carry, counter[i] & carry
+
+        next_state = np.zeros_like(current)
+        for count in range(len(self.neighbour_indices) + 1):
+            off_result, on_result = self.rule_table[:, count]
+            if not on_result and not off_result:
+                continue
+            # Runs whose neighbour count equals `count`
+            matches = np.full_like(current, ALL_ONES)
+            for i, bit in enumerate(counter):
+                matches &= bit if (count >> i) & 1 else ~bit
+            if on_result and off_result:
+                next_state |= matches
+            elif on_result:
+                next_state |= matches & current
+            else:
+                next_state |= matches & ~current
+
+        state[:self.num_cells] = next_state & self._run_mask
+        self.generation += 1
+        self.populations.append(self.get_populations())
+
+    def run(self, generations: int) -> np.ndarray:
+        """
+        Steps every run a number of generations.
+        Args:
+            generations (int): Number of generations to step.
+        Returns:
+            np.ndarray: (generation + 1, runs) population time series since the initial state.
+        """
+        for _ in range(generations):
+            self.step()
+        return self.get_population_history()
+
+    def get_population_history(self) -> np.ndarray:
+        """Returns the (generation + 1, runs) population time series since the initial state."""
+        return np.array(self.populations)
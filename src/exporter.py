@@ -0,0 +1,323 @@
+"""Renders runs of the cellular automaton to PNG frames or a video, without a window or OpenGL.
+
+Frames are drawn by a NumPy rasterizer using the same camera and colours as the live view, so it works on
+machines with no display or GPU. The simulation runs in this process while a separate encoder process
+rasterizes and writes the frames. Videos are encoded by piping frames to ffmpeg, which must be on the PATH.
+
+Usage:
+    python exporter.py Icosphere_1280_faces.obj --generations 200 --output frames
+    python exporter.py toros_400_faces_0.5_radius.obj --project --output run.mp4
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import zlib
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from helper_functions import load_and_validate_obj, cell_colors
+from automata_engine import Engine, NEIGHBOURHOODS
+from camera import OrbitalCamera
+from headless import parse_rule, DEFAULT_ON_RULE, DEFAULT_OFF_RULE
+
+DEFAULT_SIZE = (800, 600)  # The window size of the live view
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".webm", ".gif")
+FRAME_NAME = "frame_{:05d}.png"
+BATCH_PIXELS = 1 << 20  # Candidate pixels tested per rasterizer batch, bounds its memory use
+DEPTH_BITS = 24  # Precision of the rasterizer's depth buffer, the usual OpenGL one
+QUEUE_FRAMES = 8  # Frames the simulation may run ahead of the encoder
+ENCODER_POLL = 1.0  # Seconds between checks that the encoder is still running while waiting on it
+STOP_TIMEOUT = 5.0  # Seconds given a stopped encoder to be cleaned up
+PROJECTION_MARGIN = 1.05  # Space left around a fitted projection
+
+
+class Scene(NamedTuple):
+    """What the encoder process draws, sent to it once."""
+    triangles: np.ndarray  # (F, 3, 3) world positions of the cells
+    width: int
+    height: int
+    off_color: Tuple[float, float, float]
+    on_color: Tuple[float, float, float]
+    background: Tuple[float, float, float]
+
+
+def rasterize(triangles: np.ndarray, view: np.ndarray, projection: np.ndarray, width: int, height: int) -> np.ndarray:
+    """
+    Finds the nearest triangle under the centre of every pixel, as OpenGL's depth test would.
+    Triangles are tested against the pixels of their bounding boxes in batches of similarly sized boxes.
+    Triangles reaching behind the near plane or past the far plane are skipped rather than clipped.
+    Args:
+        triangles (np.ndarray): (F, 3, 3) world positions of the triangle corners.
+        view (np.ndarray): 4x4 modelview matrix.
+        projection (np.ndarray): 4x4 projection matrix.
+        width (int): Image width in pixels.
+        height (int): Image height in pixels.
+    Returns:
+        np.ndarray: (height, width) index of the triangle seen at each pixel, -1 where there is none. Row 0 is the top.
+    """
+    points = triangles.reshape(-1, 3)
+    clip = np.c_[points, np.ones(len(points))] @ (projection @ view).T
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndc = clip[:, :3] / clip[:, 3:]
+    x = ((ndc[:, 0] + 1) * width / 2).reshape(-1, 3)
+    y = ((1 - ndc[:, 1]) * height / 2).reshape(-1, 3)
+    z = ndc[:, 2].reshape(-1, 3)
+    area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+
+    # Pixel centres sit at +0.5, so these are the first and last pixels whose centres can be covered
+    x0 = np.clip(np.ceil(x.min(axis=1) - 0.5), 0, width).astype(np.int64)
+    x1 = np.clip(np.floor(x.max(axis=1) - 0.5), -1, width - 1).astype(np.int64)
+    y0 = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, height).astype(np.int64)
+    y1 = np.clip(np.floor(y.max(axis=1) - 0.5), -1, height - 1).astype(np.int64)
+    visible = (clip[:, 3].reshape(-1, 3).min(axis=1) > 0) & (np.abs(z).max(axis=1) <= 1) & (area != 0) & (x1 >= x0) & (y1 >= y0)
+    indices = np.flatnonzero(visible)
+
+    depth = np.full(width * height, np.inf)
+    ids = np.full(width * height, -1, dtype=np.int64)
+    # Group by bounding box size rounded up to a power of two, so small triangles are not padded out to big boxes
+    size_class = 64 * np.ceil(np.log2(x1[indices] - x0[indices] + 1)).astype(np.int64) + np.ceil(np.log2(y1[indices] - y0[indices] + 1)).astype(np.int64)
+    for size in np.unique(size_class):
+        group = indices[size_class == size]
+        w, h = 1 << int(size) // 64, 1 << int(size) % 64
+        batch = max(1, BATCH_PIXELS // (w * h))
+        for start in range(0, len(group), batch):
+            t = group[start:start + batch]
+            px = x0[t, None, None] + np.arange(w)[None, None, :]
+            py = y0[t, None, None] + np.arange(h)[None, :, None]
+            cx, cy = px + 0.5, py + 0.5
+            tx, ty, tz, ta = x[t, :, None, None], y[t, :, None, None], z[t, :, None, None], area[t, None, None]
+            # Barycentric weights from the edge functions, all non-negative inside either winding
+            w0 = ((tx[:, 2] - tx[:, 1]) * (cy - ty[:, 1]) - (ty[:, 2] - ty[:, 1]) * (cx - tx[:, 1])) / ta
+            w1 = ((tx[:, 0] - tx[:, 2]) * (cy - ty[:, 2]) - (ty[:, 0] - ty[:, 2]) * (cx - tx[:, 2])) / ta
+            w2 = 1 - w0 - w1
+            inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0) & (px <= x1[t, None, None]) & (py <= y1[t, None, None])
+            # NDC depth is linear in screen space, so it interpolates with the screen space weights.
+            # It is stored with DEPTH_BITS like a depth buffer, so coplanar cells tie as they do in OpenGL
+            candidate_depth = np.round((w0 * tz[:, 0] + w1 * tz[:, 1] + w2 * tz[:, 2] + 1) * (2 ** (DEPTH_BITS - 1) - 0.5))[inside]
+            candidate_pixel = (py * width + px)[inside]
+            if len(candidate_pixel) == 0:  # Thin triangles can miss every pixel centre
+                continue
+            candidate_id = np.broadcast_to(t[:, None, None], inside.shape)[inside]
+
+            # Keep the nearest candidate per pixel, then only where it beats what earlier batches drew.
+            # Ties go to the lower index, the triangle OpenGL draws first
+            order = np.lexsort((candidate_id, candidate_depth, candidate_pixel))
+            pixel = candidate_pixel[order]
+            nearest = order[np.r_[True, pixel[1:] != pixel[:-1]]]
+            pixel, nearer_depth, nearer_id = candidate_pixel[nearest], candidate_depth[nearest], candidate_id[nearest]
+            closer = (nearer_depth < depth[pixel]) | ((nearer_depth == depth[pixel]) & (nearer_id < ids[pixel]))
+            depth[pixel[closer]] = nearer_depth[closer]
+            ids[pixel[closer]] = nearer_id[closer]
+    return ids.reshape(height, width)
+
+
+def shade(ids: np.ndarray, values: np.ndarray, scene: Scene) -> np.ndarray:
+    """Colours a rasterized image by the cell values, returning (height, width, 3) uint8 RGB."""
+    colors = cell_colors(values, scene.off_color, scene.on_color)[::3]  # One colour per cell, the renderer repeats it per vertex
+    palette = np.round(np.vstack([colors, [scene.background]]) * 255).astype(np.uint8)
+    return palette[ids]  # -1 picks the background at the end of the palette
+
+
+def write_png(file_name: str, image: np.ndarray):
+    """Writes a (height, width, 3) uint8 RGB image as a PNG."""
+    height, width, _ = image.shape
+    rows = np.concatenate([np.zeros((height, 1), dtype=np.uint8), image.reshape(height, -1)], axis=1)  # Filter type 0 per row
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    with open(file_name, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
+
+
+def is_video(output: str) -> bool:
+    return os.path.splitext(output)[1].lower() in VIDEO_EXTENSIONS
+
+
+class FrameEncoder:
+    """
+    Rasterizes and writes frames on a separate process, so the simulation is not held up by them.
+    Only the cell values and the view are sent per frame; the rasterized triangle indices are reused
+    for as long as the view stays the same.
+    """
+
+    def __init__(self, scene: Scene, output: str, fps: float = 10.0):
+        if is_video(output) and shutil.which("ffmpeg") is None:
+            raise ValueError(f"Writing '{output}' needs ffmpeg on the PATH, give a directory to write PNG frames instead")
+        self.frames: "multiprocessing.Queue[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]]" = multiprocessing.Queue(QUEUE_FRAMES)
+        self.process = multiprocessing.Process(target=_encode_frames, args=(self.frames, scene, output, fps), name="FrameEncoder", daemon=True)
+
+    def start(self):
+        self.process.start()
+
+    def put(self, values: np.ndarray, view: np.ndarray, projection: np.ndarray):
+        """Queues a frame, waiting if the encoder is QUEUE_FRAMES behind."""
+        self._send((values, view, projection))
+
+    def close(self):
+        """Waits for every queued frame to be written. An encoder that has already stopped is cleaned up rather than waited on."""
+        try:
+            self._send(None)
+            self.process.join()
+        except RuntimeError:
+            self.frames.cancel_join_thread()  # Frames it never read would otherwise hold up this process's exit
+            self.process.terminate()
+            self.process.join(STOP_TIMEOUT)
+        if self.process.exitcode != 0:
+            raise RuntimeError(f"Frame encoder stopped with exit code {self.process.exitcode}")
+
+    def _send(self, item: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        """
+        Puts an item on the frame queue, checking the encoder is still running while waiting so a crashed one cannot hang the caller.
+        Raises:
+            RuntimeError: If the encoder has stopped.
+        """
+        while self.process.is_alive():
+            try:
+                self.frames.put(item, timeout=ENCODER_POLL)
+                return
+            except queue.Full:
+                pass
+        raise RuntimeError(f"Frame encoder stopped with exit code {self.process.exitcode}")
+
+
+def _encode_frames(frames: "multiprocessing.Queue", scene: Scene, output: str, fps: float):
+    """Encoder process: draws queued frames until it receives None."""
+    ffmpeg = None
+    if is_video(output):
+        command = ["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", f"{scene.width}x{scene.height}", "-r", str(fps), "-i", "-"]
+        if not output.lower().endswith(".gif"):
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-pix_fmt", "yuv420p"]  # Widely playable, needs even sizes
+        ffmpeg = subprocess.Popen(command + [output], stdin=subprocess.PIPE)
+    else:
+        os.makedirs(output, exist_ok=True)
+
+    ids, drawn_view = None, None  # Triangle indices of the last view rasterized
+    index = 0
+    while True:
+        frame = frames.get()
+        if frame is None:
+            break
+        values, view, projection = frame
+        view_projection = projection @ view
+        if drawn_view is None or not np.array_equal(drawn_view, view_projection):
+            ids = rasterize(scene.triangles, view, projection, scene.width, scene.height)
+            drawn_view = view_projection
+        image = shade(ids, values, scene)
+        if ffmpeg:
+            ffmpeg.stdin.write(image.tobytes())
+        else:
+            write_png(os.path.join(output, FRAME_NAME.format(index)), image)
+        index += 1
+
+    if ffmpeg:
+        ffmpeg.stdin.close()
+        if ffmpeg.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed with exit code {ffmpeg.returncode}")
+
+
+def fit_projection(camera: OrbitalCamera, projection: np.ndarray, width: int, height: int):
+    """Centres the camera on a projection layout and backs it off until the whole layout is in view."""
+    low, high = projection.reshape(-1, 2).min(axis=0), projection.reshape(-1, 2).max(axis=0)
+    centre, half = (low + high) / 2, (high - low) / 2
+    camera.target = np.array([centre[0], centre[1], 0.0])
+    half_height = max(half[1], half[0] * height / width) * PROJECTION_MARGIN
+    camera.radius = half_height / math.tan(math.radians(camera.fov) / 2)
+
+
+def export(engine: Engine, encoder: FrameEncoder, camera: OrbitalCamera, generations: int, width: int, height: int, orbit: float = 0.0):
+    """
+    Steps the engine, sending every generation (including the starting one) to the encoder.
+    Args:
+        engine (Engine): The automaton to run.
+        encoder (FrameEncoder): Started encoder the frames are sent to.
+        camera (OrbitalCamera): Camera the frames are seen from.
+        generations (int): Number of generations to step.
+        width (int): Frame width in pixels.
+        height (int): Frame height in pixels.
+        orbit (float): Radians the camera turns around the target each frame.
+    """
+    projection = camera.projection_matrix(width, height)
+    for generation in range(generations + 1):
+        if generation:
+            engine.step()
+            camera.azimuth += orbit
+        encoder.put(engine.values.copy(), camera.view_matrix(), projection)
+
+
+def parse_color(color: str) -> Tuple[float, float, float]:
+    """Converts a colour such as '1,0.5,0' (components from 0 to 1) into a tuple."""
+    parts = color.split(",")
+    try:
+        rgb = tuple(float(part) for part in parts)
+    except ValueError:
+        rgb = ()
+    if len(rgb) != 3 or not all(0 <= part <= 1 for part in rgb):
+        raise ValueError(f"Invalid colour '{color}', expected three numbers from 0 to 1 such as 1,0.5,0")
+    return rgb
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a run of the surface cellular automaton to PNG frames or a video, without a window.")
+    parser.add_argument("mesh", help="OBJ file to simulate on, either a path or a file name in the assets folder")
+    parser.add_argument("-n", "--generations", type=int, default=100, help="number of generations to run, one frame each")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random initial state")
+    parser.add_argument("--on-rule", type=parse_rule, default=DEFAULT_ON_RULE, help="rule for cells that are on, e.g. 0110")
+    parser.add_argument("--off-rule", type=parse_rule, default=DEFAULT_OFF_RULE, help="rule for cells that are off, e.g. 0011")
+    parser.add_argument("--neighbourhood", choices=NEIGHBOURHOODS, default="edge", help="cells sharing an edge, or sharing any vertex")
+    parser.add_argument("--project", action="store_true", help="draw the flat projection instead of the 3D mesh")
+    parser.add_argument("--width", type=int, default=DEFAULT_SIZE[0])
+    parser.add_argument("--height", type=int, default=DEFAULT_SIZE[1])
+    parser.add_argument("--azimuth", type=float, default=0.0, help="camera angle around the mesh, in degrees")
+    parser.add_argument("--elevation", type=float, default=0.0, help="camera angle above the mesh, in degrees")
+    parser.add_argument("--radius", type=float, help="camera distance, by default the live view's, or fitted to the projection")
+    parser.add_argument("--orbit", type=float, default=0.0, help="degrees the camera turns around the mesh per frame")
+    parser.add_argument("--on-color", type=parse_color, default="1,1,1", help="colour of cells that are on, e.g. 1,0.5,0")
+    parser.add_argument("--off-color", type=parse_color, default="0,0,0", help="colour of cells that are off")
+    parser.add_argument("--background", type=parse_color, default="0,0,0", help="colour behind the mesh")
+    parser.add_argument("--fps", type=float, default=10.0, help="frame rate of a video")
+    parser.add_argument("-o", "--output", default="frames", help=f"directory for PNG frames, or a video file ({', '.join(VIDEO_EXTENSIONS)})")
+    args = parser.parse_args()
+
+    mesh_file = args.mesh
+    if not os.path.exists(mesh_file):
+        mesh_file = os.path.join(os.path.dirname(__file__), '..', 'assets', mesh_file)
+    mesh = load_and_validate_obj(mesh_file)
+    engine = Engine(mesh, args.on_rule, args.off_rule, seed=args.seed, neighbourhood=args.neighbourhood)
+
+    camera = OrbitalCamera()
+    if args.project:
+        # As in the live view: the flat layout at z = 0, seen head on
+        layout = engine.make_projection_map()
+        triangles = np.concatenate([layout, np.zeros(layout.shape[:2] + (1,))], axis=2)
+        fit_projection(camera, layout, args.width, args.height)
+        orbit = 0.0
+    else:
+        triangles = mesh.get_triangles()
+        camera.azimuth, camera.elevation = math.radians(args.azimuth), math.radians(args.elevation)
+        orbit = math.radians(args.orbit)
+    if args.radius is not None:
+        camera.radius = args.radius
+
+    scene = Scene(triangles, args.width, args.height, args.off_color, args.on_color, args.background)
+    encoder = FrameEncoder(scene, args.output, args.fps)
+    encoder.start()
+    try:
+        export(engine, encoder, camera, args.generations, args.width, args.height, orbit)
+    finally:
+        encoder.close()
+    print(f"Wrote {args.generations + 1} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Runs the cellular automaton without a window, for batch simulations on machines with no display.
+
+Usage:
+    python headless.py Icosphere_320_faces.obj --generations 1000 --seed 0 --output run.npz
+"""
+import argparse
+import logging
+import os
+import re
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from helper_functions import load_and_validate_obj
+from automata_engine import Engine, NEIGHBOURHOODS
+from stepping_backends import BACKENDS
+from pattern_rules import PatternRule, parse_pattern
+from partitioned_engine import PartitionedEngine
+from mesh import Mesh
+from mesh_cache import MeshCache
+
+RULE_REGEX = r'^[01]+$'
+DEFAULT_ON_RULE = "0110"
+DEFAULT_OFF_RULE = "0011"
+
+
+class SimulationResult(NamedTuple):
+    """Outcome of a headless run."""
+    populations: np.ndarray  # Number of 'on' cells per generation, starting with the initial state
+    final_state: np.ndarray  # Cell values after the last generation
+    on_rule: Tuple[int, ...]
+    off_rule: Tuple[int, ...]
+    seed: int
+    transient: int  # Generation the run entered a repeating cycle, -1 if it never did
+    period: int  # Period of that cycle, -1 if none was found
+    neighbourhood: str = "edge"
+    births: Optional[np.ndarray] = None  # Cells that turned on to reach each generation, 0 for the initial state
+    deaths: Optional[np.ndarray] = None  # Cells that turned off to reach each generation
+    patterns: Optional[PatternRule] = None
+
+
+def parse_rule(rule: str) -> Tuple[int, ...]:
+    """Converts a rule string such as '0110' into the tuple the Engine expects."""
+    if not re.fullmatch(RULE_REGEX, rule):
+        raise ValueError(f"Invalid rule '{rule}', expected a string of 0s and 1s")
+    return tuple(int(i) for i in rule)
+
+
+def run_simulation(mesh_file: str, generations: int, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], seed: int, mesh_cache: Optional[MeshCache] = None, neighbourhood: str = "edge", processes: int = 1, backend: Optional[str] = None, patterns: Optional[PatternRule] = None) -> SimulationResult:
+    """
+    Loads a mesh and runs the automaton on it for a fixed number of generations.
+    Args:
+        mesh_file (str): Path to the OBJ file to simulate on.
+        generations (int): Number of generations to step.
+        on_rule (Tuple[int, ...]): Rule applied to cells that are on.
+        off_rule (Tuple[int, ...]): Rule applied to cells that are off.
+        seed (int): Seed for the random initial state.
+        mesh_cache (Optional[MeshCache]): Cache to load the mesh through, if any.
+        neighbourhood (str): Which cells count as neighbours, one of NEIGHBOURHOODS.
+        processes (int): Processes to split the mesh across with a PartitionedEngine, which does not look for cycles.
+        backend (Optional[str]): Stepping backend of a single process run, one of BACKENDS, None to pick the fastest.
+        patterns (Optional[PatternRule]): Next values by the pattern of 'on' neighbours, overriding the rules by count.
+    Returns:
+        SimulationResult: Per-generation populations, births and deaths, the final state and any cycle found.
+    Raises:
+        ValueError: If pattern rules are asked of a run across several processes.
+    """
+    if processes > 1 and patterns is not None:
+        raise ValueError("Pattern rules are only supported in single process runs")
+    mesh = mesh_cache.load(mesh_file) if mesh_cache else load_and_validate_obj(mesh_file)
+    if processes > 1:
+        return simulate_partitioned(mesh, generations, on_rule, off_rule, seed, neighbourhood, processes)
+    return simulate(mesh, generations, on_rule, off_rule, seed, neighbourhood, backend, patterns)
+
+
+def simulate_partitioned(mesh: Mesh, generations: int, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], seed: int, neighbourhood: str = "edge", processes: Optional[int] = None) -> SimulationResult:
+    """Runs the automaton on an already loaded mesh across several processes, see run_simulation."""
+    populations, births, deaths = (np.zeros(generations + 1, dtype=np.int64) for _ in range(3))
+    with PartitionedEngine(mesh, on_rule, off_rule, seed=seed, neighbourhood=neighbourhood, processes=processes) as engine:
+        values = engine.values
+        populations[0] = np.count_nonzero(values)
+        for generation in range(1, generations + 1):
+            engine.step()
+            previous, values = values, engine.values
+            births[generation] = np.count_nonzero(values > previous)
+            deaths[generation] = np.count_nonzero(values < previous)
+            populations[generation] = populations[generation - 1] + births[generation] - deaths[generation]
+    return SimulationResult(populations, values, on_rule, off_rule, seed, -1, -1, neighbourhood, births, deaths)
+
+
+def simulate(mesh: Mesh, generations: int, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], seed: int, neighbourhood: str = "edge", backend: Optional[str] = None, patterns: Optional[PatternRule] = None) -> SimulationResult:
+    """Runs the automaton on an already loaded mesh, see run_simulation."""
+    engine = Engine(mesh, on_rule, off_rule, seed=seed, neighbourhood=neighbourhood, backend=backend, patterns=patterns)
+    populations, births, deaths = (np.zeros(generations + 1, dtype=np.int64) for _ in range(3))
+    populations[0] = engine.population
+    for generation in range(1, generations + 1):
+        engine.step()
+        stats = engine.get_stats()
+        populations[generation], births[generation], deaths[generation] = stats.population, stats.births, stats.deaths
+        cycle = engine.get_cycle()
+        if cycle:
+            # The rest of the run repeats the cycle, so fill it in and jump to the final state.
+            # Births and deaths only repeat from the generation after the transient, reaching it came from outside the cycle
+            later = np.arange(generation + 1, generations + 1)
+            populations[later] = populations[cycle.transient + (later - cycle.transient) % cycle.period]
+            repeated = cycle.transient + 1 + (later - cycle.transient - 1) % cycle.period
+            births[later], deaths[later] = births[repeated], deaths[repeated]
+            engine.advance(generations - generation)
+            break
+
+    cycle = engine.get_cycle()
+    transient, period = cycle if cycle else (-1, -1)
+    return SimulationResult(populations, engine.values.copy(), on_rule, off_rule, seed, transient, period, neighbourhood, births, deaths, patterns)
+
+
+def save_result(result: SimulationResult, output_file: str) -> None:
+    """Writes a SimulationResult to a compressed .npz file, any pattern rules as 'pattern=value' strings."""
+    patterns = result.patterns or PatternRule({}, {})
+    np.savez_compressed(output_file,
+                        on_patterns=np.array([f"{pattern}={value}" for pattern, value in patterns.on_patterns.items()], dtype=str),
+                        off_patterns=np.array([f"{pattern}={value}" for pattern, value in patterns.off_patterns.items()], dtype=str),
+                        populations=result.populations,
+                        births=result.births,
+                        deaths=result.deaths,
+                        final_state=result.final_state,
+                        on_rule=np.array(result.on_rule, dtype=np.uint8),
+                        off_rule=np.array(result.off_rule, dtype=np.uint8),
+                        seed=result.seed,
+                        transient=result.transient,
+                        period=result.period,
+                        neighbourhood=result.neighbourhood)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the surface cellular automaton without a window.")
+    parser.add_argument("mesh", help="OBJ file to simulate on, either a path or a file name in the assets folder")
+    parser.add_argument("-n", "--generations", type=int, default=100, help="number of generations to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the random initial state")
+    parser.add_argument("--on-rule", type=parse_rule, default=DEFAULT_ON_RULE, help="rule for cells that are on, e.g. 0110")
+    parser.add_argument("--off-rule", type=parse_rule, default=DEFAULT_OFF_RULE, help="rule for cells that are off, e.g. 0011")
+    parser.add_argument("--neighbourhood", choices=NEIGHBOURHOODS, default="edge", help="cells sharing an edge, or sharing any vertex")
+    parser.add_argument("--on-pattern", type=parse_pattern, action="append", default=[], metavar="PATTERN=VALUE",
+                        help="next value of 'on' cells with this cyclic pattern of neighbours, e.g. 110100000000=0 (repeatable)")
+    parser.add_argument("--off-pattern", type=parse_pattern, action="append", default=[], metavar="PATTERN=VALUE",
+                        help="next value of 'off' cells with this cyclic pattern of neighbours (repeatable)")
+    parser.add_argument("-o", "--output", default="simulation.npz", help="where to write the results (.npz)")
+    parser.add_argument("--cache-dir", help="directory of the compiled mesh cache, disabled if not given")
+    parser.add_argument("--processes", type=int, default=1, help="split large meshes across this many processes (skips cycle detection)")
+    parser.add_argument("--backend", choices=tuple(BACKENDS), help="stepping backend, by default the fastest one available is picked")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    mesh_file = args.mesh
+    if not os.path.exists(mesh_file):
+        mesh_file = os.path.join(os.path.dirname(__file__), '..', 'assets', mesh_file)
+
+    mesh_cache = MeshCache(args.cache_dir) if args.cache_dir else None
+    patterns = PatternRule(dict(args.on_pattern), dict(args.off_pattern)) if args.on_pattern or args.off_pattern else None
+    result = run_simulation(mesh_file, args.generations, args.on_rule, args.off_rule, args.seed, mesh_cache, args.neighbourhood, args.processes, args.backend, patterns)
+    save_result(result, args.output)
+    cycle = f", cycle of period {result.period} from generation {result.transient}" if result.period > 0 else ""
+    print(f"Ran {args.generations} generations, final population {result.populations[-1]}{cycle}, results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
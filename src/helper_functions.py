@@ -1,42 +1,60 @@
-import trimesh
-from pygame import Vector3, Vector2
-from tkinter import filedialog, Tk, messagebox
-from typing import List, Tuple
+import os
+import numpy as np
+from typing import Tuple
+from mesh import Mesh, connected_components
+from obj_loader import read_obj
 
-def load_and_validate_obj(file_name: str) -> List[Tuple[Vector3, Vector3, Vector3]]:
+def load_and_validate_obj(file_name: str) -> Mesh:
     """
-    Loads an OBJ file and converts it into a list of triangle faces, with strict mesh validation.
+    Loads an OBJ file into a Mesh of vertex positions and face indices, with strict mesh validation.
+    Triangle OBJ files are parsed directly into arrays, anything else (other formats, polygon faces) goes through trimesh.
 
     Args:
         file_name (str): The path to the OBJ file to load.
 
     Returns:
-        List[Tuple[Vector3, Vector3, Vector3]]: A list of triangle faces.
+        Mesh: The triangle mesh, with its edge adjacency already built.
 
     Raises:
-        TypeError: If the file is not a trimesh.Trimesh.
+        TypeError: If the file holds no triangle mesh.
         ValueError: If the mesh is not triangular, not connected,
-                    or has faces with != 3 neighbors.
+                    or has edges shared by more than two faces.
     """
     try:
-        mesh = trimesh.load_mesh(file_name)
+        loaded = read_obj(file_name) if os.path.splitext(file_name)[1].lower() == ".obj" else None
+        vertices, faces = loaded if loaded is not None else _load_with_trimesh(file_name)
+    except TypeError:
+        raise
     except Exception as e:
         raise ValueError(f"Failed to load mesh from file '{file_name}': {e}")
 
-    if not isinstance(mesh, trimesh.Trimesh):
-        raise TypeError(f"Loaded object is not a trimesh.Trimesh: got {type(mesh)}")
+    if len(faces) == 0:
+        raise TypeError(f"Loaded object is not a triangle mesh: '{file_name}' has no faces")
 
-    if mesh.faces.shape[1] != 3:
+    if faces.shape[1] != 3:
         raise ValueError("Mesh must be triangular (all faces must have 3 vertices)")
 
-    if len(mesh.split(only_watertight=False)) > 1:
+    mesh = Mesh(vertices, faces)
+    adjacency = mesh.edge_adjacency()  # Raises on non-manifold edges
+    if np.any(connected_components(len(mesh), adjacency.across) != 0):
         raise ValueError("Mesh is not connected (it has multiple disconnected components)")
+    return mesh
 
-    verts = mesh.vertices
-    faces_indices = mesh.faces
-    return [(Vector3(*verts[i]), Vector3(*verts[j]), Vector3(*verts[k])) for i, j, k in faces_indices]
+def _load_with_trimesh(file_name: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Loads a mesh in any format trimesh understands, returning its vertices and (triangulated) faces."""
+    import trimesh  # Slow to import, and only needed for files the OBJ reader does not handle
+    mesh = trimesh.load_mesh(file_name)
+    if not isinstance(mesh, trimesh.Trimesh):
+        raise TypeError(f"Loaded object is not a trimesh.Trimesh: got {type(mesh)}")
+    return mesh.vertices, mesh.faces
+
+def cell_colors(values: np.ndarray, off_color: Tuple[float, float, float], on_color: Tuple[float, float, float]) -> np.ndarray:
+    """Returns the per-vertex colours (3 vertices per cell) of the given cell values, as float32 RGB."""
+    palette = np.array([off_color, on_color], dtype=np.float32)
+    return np.repeat(palette[values], 3, axis=0)
 
 def error_box(text: str) -> None:
+    from tkinter import messagebox
     messagebox.showerror("Mesh Loading Error", text)
 
 def get_file_from_user(file_path: str) -> str:
@@ -46,42 +64,9 @@ def get_file_from_user(file_path: str) -> str:
     Returns:
         str: The full path to the selected .obj file. Returns an empty string if the user cancels.
     """
+    from tkinter import filedialog, Tk
     root = Tk()
     root.withdraw()
     file_path = filedialog.askopenfilename(title='Open a file', initialdir=file_path, filetypes=(('object file', '*.obj'),))
     root.destroy()
     return file_path
-
-def point_in_triangle(p: Vector2, t: Tuple[Vector2, Vector2, Vector2]) -> bool:
-    """Checks if the point p is within the triangle t
-    Args:
-        p (Vector2): The point to check 
-        t (Tuple[Vector2, Vector2, Vector2]): The vertexs of the triangle
-    Returns:
-        bool: true if the point is within the triangle
-    """
-    a, b, c = t
-    # Compute vectors
-    v0 = c - a
-    v1 = b - a
-    v2 = p - a
-
-    # Compute dot products
-    dot00 = v0.dot(v0)
-    dot01 = v0.dot(v1)
-    dot02 = v0.dot(v2)
-    dot11 = v1.dot(v1)
-    dot12 = v1.dot(v2)
-
-    # Compute barycentric coordinates
-    denom = dot00 * dot11 - dot01 * dot01
-    if denom == 0:
-        return False  # Triangle is degenerate
-
-    inv_denom = 1 / denom
-    u = (dot11 * dot02 - dot01 * dot12) * inv_denom
-    v = (dot00 * dot12 - dot01 * dot02) * inv_denom
-
-    # Check if point is in triangle
-    return (u >= 0) and (v >= 0) and (u + v <= 1)
-
@@ -0,0 +1,96 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+MAGIC = b"SCAHIST1"
+HEADER_DTYPE = np.dtype([("magic", "S8"), ("num_cells", "<i8"), ("keyframe_interval", "<i8")])
+DEFAULT_KEYFRAME_INTERVAL = 64
+
+
+def record_dtype(num_cells: int) -> np.dtype:
+    """Layout of one history record, the generation it belongs to and the cells packed 8 to a byte."""
+    return np.dtype([("generation", "<i8"), ("bits", "u1", (-(-num_cells // 8),))])
+
+
+class HistoryRecorder:
+    """
+    Appends the states of an automaton to a history file.
+    Every record has the same size: record i holds the packed state itself when i is a multiple of the keyframe
+    interval (a keyframe), otherwise the packed XOR of the state with the previous record's. Only the last
+    state is kept in memory, so recording can go on for as long as there is disk space.
+    """
+
+    def __init__(self, file_name: str, num_cells: int, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL):
+        if keyframe_interval < 1:
+            raise ValueError(f"Keyframe interval must be at least 1, got {keyframe_interval}")
+        self.file_name = file_name
+        self.num_cells = num_cells
+        self.keyframe_interval = keyframe_interval
+        self.num_records = 0
+        self._record = np.zeros(1, dtype=record_dtype(num_cells))
+        self._last: Optional[np.ndarray] = None  # Packed state of the last record
+
+        self._file = open(file_name, "wb")
+        self._file.write(np.array([(MAGIC, num_cells, keyframe_interval)], dtype=HEADER_DTYPE).tobytes())
+        self._file.flush()
+
+    def append(self, generation: int, values: np.ndarray):
+        """Records the cell values of a generation."""
+        packed = np.packbits(values)
+        self._record["generation"] = generation
+        if self.num_records % self.keyframe_interval == 0:
+            self._record["bits"] = packed
+        else:
+            np.bitwise_xor(packed, self._last, out=self._record["bits"][0])
+        self._last = packed
+        self._file.write(self._record.tobytes())
+        self._file.flush()  # Readers only see whole records once they reach the file
+        self.num_records += 1
+
+    def close(self):
+        self._file.close()
+
+
+class HistoryReader:
+    """
+    Reads a history file written by a HistoryRecorder, possibly while it is still being written.
+    The file is memory-mapped, and any generation is rebuilt from its keyframe and at most
+    keyframe_interval - 1 deltas.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        header = np.fromfile(file_name, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header["magic"][0] != MAGIC:
+            raise ValueError(f"'{file_name}' is not a history file")
+        self.num_cells = int(header["num_cells"][0])
+        self.keyframe_interval = int(header["keyframe_interval"][0])
+        self.dtype = record_dtype(self.num_cells)
+        self.records = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        """Number of records, re-mapping the file if more have been written since it was last mapped."""
+        available = (os.path.getsize(self.file_name) - HEADER_DTYPE.itemsize) // self.dtype.itemsize
+        if available > len(self.records):
+            self.records = np.memmap(self.file_name, dtype=self.dtype, mode="r", offset=HEADER_DTYPE.itemsize, shape=(available,))
+        return len(self.records)
+
+    def generation(self, index: int) -> int:
+        """Returns the generation of a record."""
+        return int(self.records["generation"][index])
+
+    def find(self, generation: int) -> int:
+        """Returns the index of the last record at or before a generation, or -1 if there is none."""
+        return int(np.searchsorted(self.records["generation"][:len(self)], generation, side="right")) - 1
+
+    def state(self, index: int) -> np.ndarray:
+        """Rebuilds the cell values of a record from its keyframe and the deltas after it."""
+        if not 0 <= index < len(self):
+            raise IndexError(f"History has {len(self.records)} records, no record {index}")
+        keyframe = index - index % self.keyframe_interval
+        packed = np.bitwise_xor.reduce(self.records["bits"][keyframe:index + 1], axis=0)
+        return np.unpackbits(packed, count=self.num_cells)
+
+    def close(self):
+        self.records = np.zeros(0, dtype=self.dtype)  # Drops the mapping
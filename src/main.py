@@ -1,19 +1,24 @@
 import pygame
 from pygame.locals import DOUBLEBUF, OPENGL, QUIT 
 from OpenGL.GL import *
-from OpenGL.GLU import *
 
+import logging
 import os
+import time
+from typing import Optional
 
-from helper_functions import load_and_validate_obj, get_file_from_user, error_box
-from automata_renderer import CellularAutomataRenderer
 from control_panel import ControlPanel
+from mesh_loader import MeshLoader
+from profiler import Profiler, STEP_PHASE, FRAME_PHASE
+# The engine, renderer, mesh cache and file dialogs are imported when first needed, so the window opens without waiting for them
 
 
 # Config ----------------
 DISPLAY_SIZE = (800, 600)
 FRAME_DELAY_MS = 10
 DEFAULT_MESH_FILE = 'Icosphere_320_faces.obj'
+MESH_CACHE_DIR = '.mesh_cache'
+TRACE_FILE = 'trace_{time}.json'  # Written to the project root
 
 class App:
     """Main application class that manages the event loop and rendering pipeline."""
@@ -21,50 +26,117 @@ class App:
     def __init__(self):
         self.project_root: str = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
         self.assets_root: str = os.path.join(self.project_root, 'assets')
+        self.mesh_cache_dir: str = os.path.join(self.project_root, MESH_CACHE_DIR)
 
         pygame.init()
         pygame.display.set_mode(DISPLAY_SIZE, DOUBLEBUF | OPENGL)
         pygame.display.set_caption(self.CAPTION)
 
-        mesh = load_and_validate_obj(os.path.join(self.assets_root, DEFAULT_MESH_FILE))
-
-        self.control_panel = ControlPanel()
-        self.cellular_automata_renderer = CellularAutomataRenderer(mesh, DISPLAY_SIZE, self.control_panel.get_changes(), self.control_panel.get_state())
+        self.profiler = self.make_profiler()
+        self.control_panel = ControlPanel(self.profiler)
+        self.cellular_automata_renderer = None  # Made once the first mesh has loaded
+        self.mesh_loader: Optional[MeshLoader] = None  # Mesh being loaded in the background, if any
+        self.load_mesh(os.path.join(self.assets_root, DEFAULT_MESH_FILE))
 
     def run(self):
         """Runs the main application loop, handling input, updates, and rendering."""
         while True:
             self.handle_events()
             self.render()
+            self.check_mesh_loader()
             self.handle_UI_changes()
             pygame.time.wait(FRAME_DELAY_MS)
 
+    @staticmethod
+    def make_profiler() -> Profiler:
+        """Registers the phases of the window timed while instrumentation is turned on in the control panel."""
+        profiler = Profiler()
+        profiler.instrument(ControlPanel, "render")
+        profiler.instrument(App, "render", FRAME_PHASE)
+        return profiler
+
+    def instrument_simulation(self):
+        """Registers the phases of the simulation, once the first load has imported its modules."""
+        import mesh_cache
+        from automata_engine import Engine
+        from automata_renderer import CellularAutomataRenderer
+        # Counts the cells actually evaluated, all of them on a full sweep. _active is still the evaluated set when this is read
+        self.profiler.instrument(Engine, "calc_next_state", STEP_PHASE,
+                                 units=lambda engine: engine.num_cells if engine._active is None else len(engine._active))
+        self.profiler.instrument(Engine, "update_state", "Engine.update_state")
+        self.profiler.instrument(CellularAutomataRenderer, "draw")
+        self.profiler.instrument(mesh_cache.MeshCache, "load")
+        self.profiler.instrument(mesh_cache, "load_and_validate_obj")  # The reference mesh_cache calls on a cache miss
+
     def handle_UI_changes(self):
         """Applies user-changed settings from the UI to the automaton renderer."""
         changes, state = self.control_panel.get_changes(), self.control_panel.get_state()
         if changes["change_mesh"]: self.change_automata()
+        if self.cellular_automata_renderer is None:
+            return
         if changes["on_rule"] or changes["off_rule"]:
-            self.cellular_automata_renderer.automata.set_rule(
+            self.cellular_automata_renderer.set_rule(
                 tuple((int(i) for i in state["on_rule"])), 
                 tuple((int(i) for i in state["off_rule"]))
             )
+        if changes["neighbourhood"]:
+            self.cellular_automata_renderer.set_neighbourhood(state["neighbourhood"])
         self.cellular_automata_renderer.update_state(changes, state)
+        self.control_panel.history = self.cellular_automata_renderer.history_reader
+        self.control_panel.stats = self.cellular_automata_renderer.automata.stats
+        self.control_panel.simulation = self.cellular_automata_renderer.worker
+        if changes["instrumentation"]:
+            if state["instrumentation"]:
+                self.profiler.enable()
+            else:
+                self.profiler.disable()
+        if changes["trace"]:
+            if state["trace"]:
+                self.profiler.start_trace()
+            else:
+                trace_file = os.path.join(self.project_root, TRACE_FILE.format(time=time.strftime("%Y%m%d_%H%M%S")))
+                events = self.profiler.stop_trace(trace_file)
+                logging.info("Wrote %d trace events to %s", events, trace_file)
 
     def change_automata(self):
-        """Prompts the user to select a new `.obj` file and updates the cellular automata renderer."""
+        """Prompts the user to select a new `.obj` file and starts loading it, the current mesh keeps running meanwhile."""
+        from helper_functions import get_file_from_user
         file_path = get_file_from_user(self.assets_root)
         if file_path == "": return
+        self.load_mesh(file_path)
+
+    def load_mesh(self, file_path: str):
+        """Starts loading a mesh in the background, replacing any load still running."""
+        state = self.control_panel.get_state()
+        self.mesh_loader = MeshLoader(file_path, tuple((int(i) for i in state["on_rule"])), tuple((int(i) for i in state["off_rule"])),
+                                      state["neighbourhood"], self.mesh_cache_dir)
+        self.mesh_loader.start()
+        self.control_panel.loading = self.mesh_loader
+
+    def check_mesh_loader(self):
+        """Swaps in the renderer of the mesh being loaded once it is ready. GL objects are made here, on the main thread."""
+        if self.mesh_loader is None or not self.mesh_loader.done:
+            return
+        loader, self.mesh_loader = self.mesh_loader, None
+        self.control_panel.loading = None
         try:
-            mesh = load_and_validate_obj(file_path)
+            automata = loader.result()
         except Exception as e:
+            from helper_functions import error_box
             error_box(e)
             return
-        self.cellular_automata_renderer = CellularAutomataRenderer(mesh, DISPLAY_SIZE, self.control_panel.get_changes(), self.control_panel.get_state())
+        from automata_renderer import CellularAutomataRenderer
+        if self.cellular_automata_renderer is None:
+            self.instrument_simulation()
+        else:
+            self.cellular_automata_renderer.delete()
+        self.cellular_automata_renderer = CellularAutomataRenderer(automata, DISPLAY_SIZE, self.control_panel.get_changes(), self.control_panel.get_state())
 
     def render(self):
         """Clears the screen and draws the automaton and control panel panel."""
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        self.cellular_automata_renderer.render()
+        if self.cellular_automata_renderer is not None:
+            self.cellular_automata_renderer.render()
         self.control_panel.render()
         pygame.display.flip()
 
@@ -75,13 +147,16 @@ class App:
             if event.type == QUIT:
                 pygame.quit()
                 exit()
+            if self.cellular_automata_renderer is None:
+                continue
             if event.type == pygame.MOUSEMOTION:
-                self.cellular_automata_renderer.handle_mouse_motion(event.rel, pygame.mouse.get_pressed())
+                self.cellular_automata_renderer.handle_mouse_motion(event.pos, event.rel, pygame.mouse.get_pressed())
             if event.type == pygame.MOUSEWHEEL:
                 self.cellular_automata_renderer.handle_mouse_wheel(event.y)
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self.cellular_automata_renderer.handle_mouse_press(event)
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")  # Reports the stepping backend each engine picks
     app = App()
     app.run()
\ No newline at end of file
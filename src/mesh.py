@@ -0,0 +1,370 @@
+from typing import NamedTuple, Optional
+from math import sqrt
+import numpy as np
+
+SQRT3 = sqrt(3)
+# Where the root triangle of the projection is placed, an equilateral triangle with side 0.1
+ROOT_TRIANGLE_2D = np.array([(0, 0), (0.1, 0), (0.05, SQRT3 / 20)])
+# Face corner pairs making up each triangle edge, edge i runs from corner i to corner i + 1
+FACE_EDGES = np.array([[0, 1], [1, 2], [2, 0]])
+NEIGHBOURHOODS = ("edge", "vertex")  # Cells sharing an edge, or sharing any vertex
+
+
+class EdgeAdjacency(NamedTuple):
+    """Edge adjacency of a triangle mesh.
+    `across[f, i]` is the face on the other side of edge i of face f (or -1 on a boundary),
+    `indptr`/`indices` hold the same neighbours in CSR form, ordered by edge."""
+    across: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+
+
+class VertexAdjacency(NamedTuple):
+    """Faces sharing at least one vertex with each face, in CSR form ordered by face index."""
+    indptr: np.ndarray
+    indices: np.ndarray
+
+
+class FaceOrientation(NamedTuple):
+    """Which faces have to be flipped for every face to be wound the same way round, see orient_faces.
+    On a non-orientable mesh no such choice exists: `flipped` then agrees along a spanning tree of the faces,
+    but some neighbouring faces are still wound opposite ways."""
+    flipped: np.ndarray  # (F,) bool
+    orientable: bool
+
+
+class Mesh:
+    """A triangle mesh stored as a vertex position array and an integer face index array."""
+
+    def __init__(self, vertices: np.ndarray, faces: np.ndarray, *, edge_adjacency: Optional[EdgeAdjacency] = None, projection: Optional[np.ndarray] = None):
+        """
+        Args:
+            vertices (np.ndarray): (V, 3) vertex positions.
+            faces (np.ndarray): (F, 3) vertex indices per face.
+            edge_adjacency (Optional[EdgeAdjacency]): Previously built adjacency, e.g. from the mesh cache.
+            projection (Optional[np.ndarray]): Previously built projection layout, e.g. from the mesh cache.
+        """
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+        self.faces = np.ascontiguousarray(faces, dtype=np.int64)
+        self._edge_adjacency = edge_adjacency
+        self._vertex_adjacency: Optional[VertexAdjacency] = None
+        self._ordered_vertex_adjacency: Optional[VertexAdjacency] = None
+        self._orientation: Optional[FaceOrientation] = None
+        self._projection = projection
+
+    def __len__(self):
+        return len(self.faces)
+
+    def get_triangles(self) -> np.ndarray:
+        """Returns the (F, 3, 3) array of triangle vertex positions."""
+        return self.vertices[self.faces]
+
+    def edge_adjacency(self) -> EdgeAdjacency:
+        """Returns the edge adjacency of the mesh, building it on first use."""
+        if self._edge_adjacency is None:
+            self._edge_adjacency = build_edge_adjacency(self.faces, len(self.vertices))
+        return self._edge_adjacency
+
+    def vertex_adjacency(self) -> VertexAdjacency:
+        """Returns the vertex adjacency of the mesh, building it on first use."""
+        if self._vertex_adjacency is None:
+            self._vertex_adjacency = build_vertex_adjacency(self.faces, len(self.vertices))
+        return self._vertex_adjacency
+
+    def centroids(self) -> np.ndarray:
+        """Returns the (F, 3) centroid of every face."""
+        return self.get_triangles().mean(axis=1)
+
+    def normals(self) -> np.ndarray:
+        """Returns the (F, 3) unit normal of every face, following its winding (zero for degenerate faces)."""
+        triangles = self.get_triangles()
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+    def orientation(self) -> FaceOrientation:
+        """Returns the face flips that make the winding consistent, building them on first use."""
+        if self._orientation is None:
+            self._orientation = orient_faces(self.vertices, self.faces, self.edge_adjacency())
+        return self._orientation
+
+    def ordered_vertex_adjacency(self) -> VertexAdjacency:
+        """Returns the vertex adjacency with each face's neighbours in cyclic order, building it on first use."""
+        if self._ordered_vertex_adjacency is None:
+            self._ordered_vertex_adjacency = order_around_faces(self.centroids(), self.normals(), self.get_triangles()[:, 0],
+                                                                self.vertex_adjacency(), self.orientation().flipped)
+        return self._ordered_vertex_adjacency
+
+    def projection_layout(self) -> np.ndarray:
+        """Returns the (F, 3, 2) unfolded 2D layout of the mesh, building it on first use."""
+        if self._projection is None:
+            self._projection = unfold_projection(self.faces, self.edge_adjacency())
+        return self._projection
+
+
+def build_edge_adjacency(faces: np.ndarray, num_verts: int) -> EdgeAdjacency:
+    """
+    Finds the faces sharing each edge by sorting an integer edge table, O(F log F).
+    Args:
+        faces (np.ndarray): (F, 3) vertex indices per face.
+        num_verts (int): Number of vertices the faces index into.
+    Returns:
+        EdgeAdjacency: The neighbour across each face edge and the equivalent CSR structure.
+    Raises:
+        ValueError: If any edge is shared by more than two faces (non-manifold mesh).
+    """
+    num_faces = len(faces)
+    # Half edge h belongs to face h // 3 and is edge h % 3 of that face
+    half_edges = np.sort(faces[:, FACE_EDGES].reshape(-1, 2), axis=1)
+    keys = half_edges[:, 0] * num_verts + half_edges[:, 1]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # Group equal keys, each group is one undirected edge
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    group_sizes = np.diff(np.r_[starts, len(sorted_keys)])
+
+    non_manifold = starts[group_sizes > 2]
+    if len(non_manifold):
+        examples = ", ".join(str(tuple(half_edges[order[s]].tolist())) for s in non_manifold[:5])
+        raise ValueError(f"Mesh is not manifold: {len(non_manifold)} edges are shared by more than two faces (e.g. vertex pairs {examples})")
+
+    first = order[starts[group_sizes == 2]]
+    second = order[starts[group_sizes == 2] + 1]
+    # Degenerate faces can repeat an edge within themselves, they are not their own neighbour
+    keep = first // 3 != second // 3
+    first, second = first[keep], second[keep]
+
+    across = np.full(num_faces * 3, -1, dtype=np.int64)
+    across[first] = second // 3
+    across[second] = first // 3
+    across = across.reshape(num_faces, 3)
+
+    has_neighbour = across >= 0
+    indptr = np.zeros(num_faces + 1, dtype=np.int64)
+    np.cumsum(has_neighbour.sum(axis=1), out=indptr[1:])
+    indices = across[has_neighbour]
+    return EdgeAdjacency(across, indptr, indices)
+
+
+def build_vertex_adjacency(faces: np.ndarray, num_verts: int) -> VertexAdjacency:
+    """
+    Finds the faces sharing a vertex with each face, by pairing up every two faces around each vertex.
+    Args:
+        faces (np.ndarray): (F, 3) vertex indices per face.
+        num_verts (int): Number of vertices the faces index into.
+    Returns:
+        VertexAdjacency: The neighbours of each face, a face is not its own neighbour.
+    """
+    num_faces = len(faces)
+    # Faces grouped by vertex, corner c belongs to face c // 3
+    corner_vertices = faces.ravel()
+    order = np.argsort(corner_vertices, kind="stable")
+    vertex_faces = order // 3
+    fan_sizes = np.bincount(corner_vertices, minlength=num_verts)
+    fan_starts = np.cumsum(fan_sizes) - fan_sizes
+
+    # Every (face, other face) pair within each vertex's fan
+    sizes = fan_sizes[corner_vertices[order]]
+    firsts = np.repeat(vertex_faces, sizes)
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    seconds = vertex_faces[np.repeat(fan_starts[corner_vertices[order]], sizes) + offsets]
+
+    # Faces sharing an edge meet in two fans, keep each pair once
+    keys = np.sort(firsts[firsts != seconds] * num_faces + seconds[firsts != seconds])
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]]
+    indptr = np.zeros(num_faces + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_faces, minlength=num_faces), out=indptr[1:])
+    return VertexAdjacency(indptr, keys % num_faces)
+
+
+def connected_components(num_faces: int, across: np.ndarray) -> np.ndarray:
+    """
+    Labels the faces joined up through shared edges, with a vectorized union-find: every edge hooks the root of
+    its larger side onto the root of its smaller one, then paths are compressed by pointer jumping.
+    Args:
+        num_faces (int): Number of faces.
+        across (np.ndarray): (F, 3) neighbour across each face edge, -1 on a boundary (see EdgeAdjacency).
+    Returns:
+        np.ndarray: The smallest face index in each face's component.
+    """
+    faces, slots = np.nonzero(across >= 0)
+    first, second = faces, across[faces, slots]
+    first, second = first[first < second], second[first < second]  # Each shared edge once
+    parent = np.arange(num_faces)
+    while True:
+        root_first, root_second = parent[first], parent[second]
+        joining = root_first != root_second
+        if not joining.any():
+            return parent
+        # Edges inside an already joined component can be dropped for good
+        first, second = first[joining], second[joining]
+        root_first, root_second = root_first[joining], root_second[joining]
+        # A root hooked by several edges ends up on one of them, the rest are joined in a later round
+        parent[np.maximum(root_first, root_second)] = np.minimum(root_first, root_second)
+        while True:  # Point every face straight at its root
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+
+def to_padded(indptr: np.ndarray, indices: np.ndarray, fill: int) -> np.ndarray:
+    """
+    Converts a CSR neighbour structure into a padded (K, N) array, one row per neighbour slot.
+    Args:
+        indptr (np.ndarray): CSR row pointers, length N + 1.
+        indices (np.ndarray): CSR column indices.
+        fill (int): Value used for slots past the end of a row.
+    Returns:
+        np.ndarray: Padded neighbour indices where K is the largest row length.
+    """
+    row_lengths = np.diff(indptr)
+    width = int(row_lengths.max()) if len(row_lengths) else 0
+    padded = np.full((width, len(row_lengths)), fill, dtype=np.int64)
+    rows = np.repeat(np.arange(len(row_lengths)), row_lengths)
+    slots = np.arange(len(indices)) - indptr[rows]
+    padded[slots, rows] = indices
+    return padded
+
+
+def unfold_projection(faces: np.ndarray, adjacency: EdgeAdjacency, root: int = 0) -> np.ndarray:
+    """
+    Unfolds the mesh into 2D as equilateral triangles, laid out along a breadth first spanning tree from `root`.
+    Each BFS level is placed at once: a child triangle reuses its parent's 2D positions for the shared edge
+    and its third vertex is the shared edge rotated by 60 degrees, to the side given by the child's winding.
+    Args:
+        faces (np.ndarray): (F, 3) vertex indices per face.
+        adjacency (EdgeAdjacency): Edge adjacency of the faces.
+        root (int): Face placed first, at ROOT_TRIANGLE_2D.
+    Returns:
+        np.ndarray: (F, 3, 2) 2D vertex positions, in the same vertex order as `faces`.
+    """
+    layout = np.zeros((len(faces), 3, 2))
+    layout[root] = ROOT_TRIANGLE_2D
+    for parents, children in _spanning_tree_levels(adjacency, root, np.zeros(len(faces), dtype=bool)):
+        _place_children(faces[parents], faces[children], layout[parents], layout, children)
+    return layout
+
+
+def _spanning_tree_levels(adjacency: EdgeAdjacency, root: int, visited: np.ndarray):
+    """
+    Walks the faces reachable from `root` breadth first, yielding the (parents, children) arrays of each level.
+    Each child is reached from the first face of the previous level to share an edge with it.
+    `visited` is updated in place, so walks from several roots can share it.
+    """
+    visited[root] = True
+    row_lengths = np.diff(adjacency.indptr)
+    frontier = np.array([root])
+    while len(frontier):
+        # Every (parent, neighbour) pair in queue order, keeping the first parent to reach each unvisited face
+        counts = row_lengths[frontier]
+        parents = np.repeat(frontier, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        children = adjacency.indices[adjacency.indptr[parents] + offsets]
+        unvisited = ~visited[children]
+        parents, children = parents[unvisited], children[unvisited]
+        children, first = np.unique(children, return_index=True)
+        order = np.argsort(first)
+        parents, children = parents[first[order]], children[order]
+        visited[children] = True
+        yield parents, children
+        frontier = children
+
+
+def orient_faces(vertices: np.ndarray, faces: np.ndarray, adjacency: EdgeAdjacency) -> FaceOrientation:
+    """
+    Works out which faces to flip so that neighbours run along their shared edge in opposite directions,
+    the condition for a consistent winding. Flips are carried out from one face of each connected component
+    along a breadth first spanning tree, then every shared edge is checked: any still running the same way
+    in both faces means the mesh is non-orientable (e.g. a Mobius strip).
+    Which way round each component ends up does not depend on the file's winding where it can be helped:
+    closed components face outwards (positive signed volume), open ones keep the winding most of their faces had.
+    Args:
+        vertices (np.ndarray): (V, 3) vertex positions.
+        faces (np.ndarray): (F, 3) vertex indices per face.
+        adjacency (EdgeAdjacency): Edge adjacency of the faces.
+    Returns:
+        FaceOrientation: The flips and whether they make every shared edge consistent.
+    """
+    num_faces = len(faces)
+    flipped = np.zeros(num_faces, dtype=bool)
+    visited = np.zeros(num_faces, dtype=bool)
+    components = np.zeros(num_faces, dtype=np.int64)
+    num_components = 0
+    while not visited.all():
+        root = int(np.argmin(visited))
+        components[root] = num_components
+        for parents, children in _spanning_tree_levels(adjacency, root, visited):
+            slots = np.argmax(adjacency.across[parents] == children[:, None], axis=1)
+            flipped[children] = flipped[parents] ^ _same_direction(faces, parents, slots, children)
+            components[children] = num_components
+        num_components += 1
+
+    triangles = vertices[faces]
+    signs = np.where(flipped, -1.0, 1.0)
+    volumes = np.bincount(components, signs * np.einsum("ij,ij->i", triangles[:, 0], np.cross(triangles[:, 1], triangles[:, 2])), num_components)
+    open_faces = np.bincount(components, (adjacency.across < 0).any(axis=1), num_components)
+    majority_flipped = 2 * np.bincount(components, flipped, num_components) > np.bincount(components, minlength=num_components)
+    flipped ^= np.where(open_faces > 0, majority_flipped, volumes < 0)[components]
+
+    faces_with, slots = np.nonzero(adjacency.across >= 0)
+    others = adjacency.across[faces_with, slots]
+    consistent = (flipped[faces_with] ^ flipped[others]) == _same_direction(faces, faces_with, slots, others)
+    return FaceOrientation(flipped, bool(consistent.all()))
+
+
+def _same_direction(faces: np.ndarray, first: np.ndarray, slots: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Whether each second face runs along edge `slot` of its first face in the same direction as the first face does."""
+    start = faces[first, slots]
+    end = faces[first, (slots + 1) % 3]
+    start_corner = np.argmax(faces[second] == start[:, None], axis=1)
+    return faces[second, (start_corner + 1) % 3] == end
+
+
+def order_around_faces(centroids: np.ndarray, normals: np.ndarray, references: np.ndarray, adjacency: VertexAdjacency, flipped: np.ndarray) -> VertexAdjacency:
+    """
+    Sorts each face's neighbours by angle around it, all faces at once: every neighbour's centroid is projected
+    into the face's plane and measured from the direction of a reference point, counter-clockwise about the
+    face's normal after flipping (so the same way round as its consistent winding).
+    Args:
+        centroids (np.ndarray): (F, 3) face centroids.
+        normals (np.ndarray): (F, 3) face normals following the original winding.
+        references (np.ndarray): (F, 3) point each face's angles are measured from, e.g. its first vertex.
+        adjacency (VertexAdjacency): Neighbours to sort.
+        flipped (np.ndarray): (F,) faces whose normal is reversed, see FaceOrientation.
+    Returns:
+        VertexAdjacency: The same neighbours, each row in cyclic order.
+    """
+    rows = np.repeat(np.arange(len(centroids)), np.diff(adjacency.indptr))
+    normals = np.where(flipped[:, None], -normals, normals)
+    right = references - centroids
+    right -= normals * np.einsum("ij,ij->i", right, normals)[:, None]
+    up = np.cross(normals, right)
+    offsets = centroids[adjacency.indices] - centroids[rows]
+    angles = np.arctan2(np.einsum("ij,ij->i", offsets, up[rows]), np.einsum("ij,ij->i", offsets, right[rows]))
+    order = np.lexsort((angles, rows))
+    return VertexAdjacency(adjacency.indptr, adjacency.indices[order])
+
+
+def _place_children(parent_faces: np.ndarray, child_faces: np.ndarray, parent_layout: np.ndarray, layout: np.ndarray, children: np.ndarray):
+    """Writes the 2D positions of a batch of children, each sharing an edge with its already placed parent."""
+    rows = np.arange(len(children))
+    # Shared edge corners in the parent's vertex order (A before B) and the child's corner for each vertex
+    parent_shared = (parent_faces[:, :, None] == child_faces[:, None, :]).any(axis=2)
+    parent_a = np.argmax(parent_shared, axis=1)
+    parent_b = 2 - np.argmax(parent_shared[:, ::-1], axis=1)
+    child_a = np.argmax(child_faces == parent_faces[rows, parent_a][:, None], axis=1)
+    child_b = np.argmax(child_faces == parent_faces[rows, parent_b][:, None], axis=1)
+    child_new = 3 - child_a - child_b
+
+    # If the new vertex follows A cyclically in the child's winding it is placed clockwise of the edge
+    angles = np.where((child_new - child_a) % 3 == 1, -np.pi / 3, np.pi / 3)
+    point_a, point_b = parent_layout[rows, parent_a], parent_layout[rows, parent_b]
+    edge = point_b - point_a
+    cos, sin = np.cos(angles), np.sin(angles)
+    new_point = point_a + np.stack([edge[:, 0] * cos - edge[:, 1] * sin, edge[:, 0] * sin + edge[:, 1] * cos], axis=1)
+
+    layout[children, child_a] = point_a
+    layout[children, child_b] = point_b
+    layout[children, child_new] = new_point
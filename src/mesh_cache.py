@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from helper_functions import load_and_validate_obj
+from mesh import Mesh, EdgeAdjacency
+
+CACHE_FORMAT_VERSION = 1  # Bump whenever the stored arrays or how they are built changes
+DEFAULT_MAX_BYTES = 1 << 30
+META_FILE = "meta.json"
+ARRAY_NAMES = ("vertices", "faces", "across", "indptr", "indices", "projection")
+
+
+class MeshCache:
+    """
+    On-disk cache of compiled meshes, keyed by a hash of the OBJ file's contents.
+    Each entry is a directory of .npy files (vertices, faces, adjacency and projection layout) that are
+    memory-mapped on load, so a previously seen mesh skips parsing, validation, adjacency and unfolding.
+    The cache is capped at `max_bytes`, evicting the least recently used entries.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def load(self, file_name: str) -> Mesh:
+        """
+        Loads a mesh from the cache, compiling and storing it first if it is missing or stale.
+        Args:
+            file_name (str): The path to the OBJ file to load.
+        Returns:
+            Mesh: The mesh with its edge adjacency and projection layout already available.
+        Raises:
+            ValueError, TypeError: As load_and_validate_obj, if the file is not a valid mesh.
+        """
+        key = self._content_hash(file_name)
+        mesh = self._read_entry(key)
+        if mesh is None:
+            mesh = load_and_validate_obj(file_name)
+            mesh.projection_layout()
+            self._write_entry(key, mesh, file_name)
+            self._evict(keep=key)
+        return mesh
+
+    @staticmethod
+    def _content_hash(file_name: str) -> str:
+        digest = hashlib.sha256()
+        with open(file_name, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _read_entry(self, key: str) -> Optional[Mesh]:
+        """Memory-maps a cache entry, returning None (and removing it) if it is missing or stale."""
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as file:
+                meta = json.load(file)
+            if meta["format_version"] != CACHE_FORMAT_VERSION:
+                raise ValueError("Cache entry was written by a different format version")
+            arrays = {name: np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAY_NAMES}
+            num_faces = meta["num_faces"]
+            if arrays["faces"].shape != (num_faces, 3) or arrays["projection"].shape != (num_faces, 3, 2) or len(arrays["indptr"]) != num_faces + 1:
+                raise ValueError("Cache entry arrays do not match its metadata")
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+        os.utime(meta_path)  # Last use time, for LRU eviction
+        adjacency = EdgeAdjacency(arrays["across"], arrays["indptr"], arrays["indices"])
+        return Mesh(arrays["vertices"], arrays["faces"], edge_adjacency=adjacency, projection=arrays["projection"])
+
+    def _write_entry(self, key: str, mesh: Mesh, file_name: str):
+        """Writes a cache entry into a temporary directory and moves it into place, so readers never see half an entry."""
+        adjacency = mesh.edge_adjacency()
+        arrays: Dict[str, np.ndarray] = {"vertices": mesh.vertices, "faces": mesh.faces,
+                                         "across": adjacency.across, "indptr": adjacency.indptr, "indices": adjacency.indices,
+                                         "projection": mesh.projection_layout()}
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+            with open(os.path.join(temp_dir, META_FILE), "w") as file:
+                json.dump({"format_version": CACHE_FORMAT_VERSION, "source": os.path.abspath(file_name), "num_faces": len(mesh)}, file)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            os.replace(temp_dir, self._entry_dir(key))
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)  # Caching is best effort, the mesh itself is still usable
+
+    def _evict(self, keep: str):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._entry_dir(key)
+            meta_path = os.path.join(entry_dir, META_FILE)
+            if key == keep or not os.path.exists(meta_path):
+                continue
+            entries.append((os.path.getmtime(meta_path), self._entry_size(key), entry_dir))
+
+        total = sum(size for _, size, _ in entries) + self._entry_size(keep)
+        for _, size, entry_dir in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+    def _entry_size(self, key: str) -> int:
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(entry_dir))
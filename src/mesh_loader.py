@@ -0,0 +1,83 @@
+import os
+import threading
+from typing import NamedTuple, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:  # Imported by the loader thread, so they stay off the startup path
+    from automata_engine import Engine
+
+LOAD_STAGES = ("Reading mesh", "Building engine", "Unfolding projection", "Indexing surface")
+
+
+class LoadProgress(NamedTuple):
+    """How far a background load has got."""
+    file_name: str
+    stage: str  # One of LOAD_STAGES
+    fraction: float  # Share of the stages finished, 0 to 1
+
+
+class MeshLoader:
+    """
+    Loads a mesh and builds its Engine (neighbours, projection and surface index) on a background thread,
+    so the window keeps drawing the current mesh while a large one loads.
+    GL objects can only be made on the main thread, so the loader stops at the engine: the app polls `done`
+    every frame and builds the renderer from `result()` once it is.
+    """
+
+    def __init__(self, file_name: str, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...], neighbourhood: str = "edge", cache_dir: Optional[str] = None):
+        """
+        Args:
+            file_name (str): Path to the mesh file.
+            on_rule (Tuple[int, ...]): Rule applied to cells that are on.
+            off_rule (Tuple[int, ...]): Rule applied to cells that are off.
+            neighbourhood (str): Which cells count as neighbours, one of NEIGHBOURHOODS.
+            cache_dir (Optional[str]): Directory of the compiled mesh cache to load through, if any.
+        """
+        self.file_name = file_name
+        self.on_rule, self.off_rule = on_rule, off_rule
+        self.neighbourhood = neighbourhood
+        self.cache_dir = cache_dir
+        self.progress = LoadProgress(os.path.basename(file_name), LOAD_STAGES[0], 0.0)
+        self._engine: Optional["Engine"] = None
+        self._error: Optional[Exception] = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="MeshLoader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def done(self) -> bool:
+        """Whether the load has finished, successfully or not."""
+        return self._done.is_set()
+
+    def result(self) -> "Engine":
+        """
+        Returns the engine built for the mesh, waiting for the load to finish if it has not yet.
+        Raises:
+            Exception: Whatever the load failed with, e.g. the ValueError of an invalid mesh.
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._engine
+
+    def _run(self):
+        try:
+            import mesh_cache
+            from automata_engine import Engine
+            mesh = mesh_cache.MeshCache(self.cache_dir).load(self.file_name) if self.cache_dir else mesh_cache.load_and_validate_obj(self.file_name)
+            self._set_stage(1)
+            engine = Engine(mesh, self.on_rule, self.off_rule, neighbourhood=self.neighbourhood)
+            self._set_stage(2)
+            engine.make_projection_map()
+            self._set_stage(3)
+            engine.make_surface_index()
+            self._engine = engine
+        except Exception as error:
+            self._error = error
+        finally:
+            self._done.set()
+
+    def _set_stage(self, stage: int):
+        # Replaced whole, so the main thread never sees a half updated progress
+        self.progress = LoadProgress(self.progress.file_name, LOAD_STAGES[stage], stage / len(LOAD_STAGES))
@@ -0,0 +1,123 @@
+import re
+import warnings
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_BYTES = 1 << 24  # Bytes of the file parsed at a time
+MERGE_DIGITS = 8  # Vertices whose positions agree to this many decimals are merged, as trimesh does
+TEXTURE_NORMAL_REGEX = re.compile(rb"/\S*")  # The '/vt/vn' part of a face corner
+
+
+def read_obj(file_name: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Reads the vertices and triangles of an OBJ file straight into arrays, a chunk of lines at a time.
+    Only 'v' and 'f' lines are used, face corners may be 'v', 'v/vt', 'v//vn' or 'v/vt/vn' and indices may be negative.
+    Vertices at the same position are merged, so faces split along texture seams are still joined up.
+    Args:
+        file_name (str): The path to the OBJ file.
+    Returns:
+        Optional[Tuple[np.ndarray, np.ndarray]]: (V, 3) vertex positions and (F, 3) vertex indices per face,
+        or None if the file has faces that are not triangles.
+    Raises:
+        OSError: If the file cannot be read.
+        ValueError: If a 'v' or 'f' line cannot be parsed or a face refers to a missing vertex.
+    """
+    vertex_chunks: List[np.ndarray] = []
+    face_chunks: List[np.ndarray] = []
+    num_vertices = 0
+    with open(file_name, "rb") as file:
+        remainder = b""
+        while True:
+            data = file.read(CHUNK_BYTES)
+            chunk = remainder + data
+            if data:
+                # Only whole lines are parsed, the last partial line is carried into the next chunk
+                cut = chunk.rfind(b"\n") + 1
+                chunk, remainder = chunk[:cut], chunk[cut:]
+            if chunk:
+                lines = chunk.split(b"\n")
+                faces = _parse_faces(lines, num_vertices)
+                if faces is None:
+                    return None
+                vertices = _parse_vertices(lines)
+                num_vertices += len(vertices)
+                vertex_chunks.append(vertices)
+                face_chunks.append(faces)
+            if not data:
+                break
+
+    vertices = np.concatenate(vertex_chunks) if vertex_chunks else np.zeros((0, 3))
+    faces = np.concatenate(face_chunks) if face_chunks else np.zeros((0, 3), dtype=np.int64)
+    if len(faces) and (faces.min() < 0 or faces.max() >= len(vertices)):
+        raise ValueError(f"A face refers to a vertex that does not exist, the file has {len(vertices)} vertices")
+    return merge_vertices(vertices, faces)
+
+
+def _parse_vertices(lines: List[bytes]) -> np.ndarray:
+    """Returns the positions on the 'v' lines of a chunk."""
+    vertex_lines = [line[2:] for line in lines if line[:2] == b"v "]
+    values = _parse_numbers(b" ".join(vertex_lines), np.float64)
+    if len(values) != 3 * len(vertex_lines):
+        # Some lines carry a w coordinate or a colour as well, only the first three values are the position
+        values = _parse_numbers(b" ".join(b" ".join(line.split()[:3]) for line in vertex_lines), np.float64)
+        if len(values) != 3 * len(vertex_lines):
+            raise ValueError("Could not parse the vertex positions")
+    return values.reshape(-1, 3)
+
+
+def _parse_faces(lines: List[bytes], vertices_before: int) -> Optional[np.ndarray]:
+    """Returns the 0 based vertex indices on the 'f' lines of a chunk, or None if a face is not a triangle."""
+    face_lines = [line[2:] for line in lines if line[:2] == b"f "]
+    text = b" ".join(face_lines)
+    if b"/" in text:
+        text = TEXTURE_NORMAL_REGEX.sub(b"", text)
+    indices = _parse_numbers(text, np.int64)
+    if len(indices) != 3 * len(face_lines):
+        if any(len(line.split()) != 3 for line in face_lines):
+            return None
+        raise ValueError("Could not parse the face indices")
+    indices = indices.reshape(-1, 3)
+    if np.any(indices == 0):
+        raise ValueError("Face indices start at 1, found a 0")
+
+    if np.any(indices < 0):
+        # Negative indices count back from the last vertex defined before the face's line
+        counts, vertex_count = [], vertices_before
+        for line in lines:
+            if line[:2] == b"v ":
+                vertex_count += 1
+            elif line[:2] == b"f ":
+                counts.append(vertex_count)
+        return np.where(indices > 0, indices - 1, np.array(counts)[:, None] + indices)
+    return indices - 1
+
+
+def _parse_numbers(text: bytes, dtype) -> np.ndarray:
+    """Parses whitespace separated numbers, stopping at the first unparsable one (callers check the length)."""
+    if not text.strip():
+        return np.zeros(0, dtype=dtype)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)  # Older NumPy warns and returns what it parsed
+        try:
+            return np.fromstring(text, dtype=dtype, sep=" ")
+        except ValueError:  # Newer NumPy raises instead
+            return np.zeros(0, dtype=dtype)
+
+
+def merge_vertices(vertices: np.ndarray, faces: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Merges vertices with the same position (to MERGE_DIGITS decimals), keeping each position's first occurrence in order."""
+    if len(vertices) == 0:
+        return vertices, faces
+    keys = np.round(vertices * 10 ** MERGE_DIGITS).astype(np.int64)
+    order = np.lexsort(keys.T[::-1])  # Stable, so the first occurrence of each position leads its group
+    sorted_keys = keys[order]
+    starts = np.r_[True, np.any(sorted_keys[1:] != sorted_keys[:-1], axis=1)]
+    firsts = order[starts]
+
+    # Number the merged vertices by first occurrence, so a file without duplicates keeps its numbering
+    rank = np.empty(len(firsts), dtype=np.int64)
+    rank[np.argsort(firsts)] = np.arange(len(firsts))
+    merged = np.empty(len(vertices), dtype=np.int64)
+    merged[order] = rank[np.cumsum(starts) - 1]
+    return vertices[np.sort(firsts)], merged[faces]
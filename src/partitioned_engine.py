@@ -0,0 +1,215 @@
+import os
+from multiprocessing import Barrier, Pipe, Process, shared_memory
+from multiprocessing.connection import Connection
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from automata_engine import INITIAL_ON_CHANCE, neighbour_table, compile_rule_table
+from mesh import Mesh
+
+
+def partition_cells(points: np.ndarray, parts: int) -> np.ndarray:
+    """
+    Splits points into balanced parts by recursive coordinate bisection.
+    Each split cuts across the longest side of the points' bounding box, so the parts are compact
+    and the cells of a mesh split this way have few neighbours in other parts.
+    Args:
+        points (np.ndarray): (N, 3) positions, e.g. cell centroids.
+        parts (int): Number of parts, need not be a power of two.
+    Returns:
+        np.ndarray: (N,) part of each point, the part sizes differ by at most one.
+    """
+    if parts < 1:
+        raise ValueError(f"Number of parts must be at least 1, got {parts}")
+    labels = np.zeros(len(points), dtype=np.int64)
+
+    def split(indices: np.ndarray, first: int, count: int):
+        if count == 1:
+            labels[indices] = first
+            return
+        left = count // 2
+        axis = np.argmax(np.ptp(points[indices], axis=0)) if len(indices) else 0
+        ordered = indices[np.argsort(points[indices, axis], kind="stable")]
+        cut = len(indices) * left // count  # Sizes proportional to the parts on each side
+        split(ordered[:cut], first, left)
+        split(ordered[cut:], first + left, count - left)
+
+    split(np.arange(len(points)), 0, parts)
+    return labels
+
+
+class Partition:
+    """
+    The cells one worker steps: slots start to stop of the shared state, which stores the cells partition by partition.
+    Its neighbour table is rewritten into a local numbering, where local index i < stop - start is slot start + i,
+    then come the halo cells and a last always 'off' padding slot.
+    """
+
+    def __init__(self, start: int, stop: int, neighbour_slots: np.ndarray, num_cells: int):
+        """
+        Args:
+            start (int): First slot of the partition.
+            stop (int): Slot after its last one.
+            neighbour_slots (np.ndarray): (K, F) neighbour table of every slot, padded with num_cells.
+            num_cells (int): Number of cells, F.
+        """
+        self.start, self.stop = start, stop
+        neighbours = neighbour_slots[:, start:stop]
+        # Neighbours in other partitions, read from the shared state every generation
+        outside = np.sort(neighbours.ravel())
+        outside = outside[np.r_[True, outside[1:] != outside[:-1]]] if len(outside) else outside
+        self.halo = outside[((outside < start) | (outside >= stop)) & (outside != num_cells)]
+
+        local = np.zeros(num_cells + 1, dtype=np.int64)
+        local[start:stop] = np.arange(stop - start)
+        local[self.halo] = stop - start + np.arange(len(self.halo))
+        local[num_cells] = stop - start + len(self.halo)
+        self.neighbour_indices = local[neighbours]
+
+
+class PartitionedEngine:
+    """
+    Steps the automaton of a large mesh across several processes.
+    The cells are split into one compact partition per process. The state of every cell lives in a shared memory
+    double buffer: each generation, every process gathers the values of its halo (the neighbouring cells owned by
+    other partitions) from the current buffer, steps its own cells and writes them into the next buffer, then waits
+    at a barrier for the others. Results are identical to an `Engine` with the same seed, rules and neighbourhood.
+    """
+
+    def __init__(self, mesh: Mesh, on_rule: Tuple[int, ...] = (0, 1, 1, 0), off_rule: Tuple[int, ...] = (0, 1, 1, 0), *, seed: Optional[int] = None, neighbourhood: str = "edge", processes: Optional[int] = None):
+        """
+        Args:
+            mesh (Mesh): Mesh whose faces are the cells.
+            on_rule (Tuple[int, ...]): Rule applied to cells that are on.
+            off_rule (Tuple[int, ...]): Rule applied to cells that are off.
+            seed (Optional[int]): Seed for the random initial state.
+            neighbourhood (str): Which cells count as neighbours, one of NEIGHBOURHOODS.
+            processes (Optional[int]): Number of worker processes, defaults to the number of CPUs.
+        """
+        self.num_cells = num_cells = len(mesh)
+        self.processes = max(1, min(processes or os.cpu_count() or 1, num_cells))
+        neighbour_indices = neighbour_table(mesh, neighbourhood)
+        self.max_count = len(neighbour_indices)
+        self.neighbourhood = neighbourhood
+        self.parts = partition_cells(mesh.get_triangles().mean(axis=1), self.processes)
+
+        # The shared state stores the cells partition by partition, so each worker writes one contiguous slice.
+        # Cell c is kept in slot _slots[c], the padding index num_cells stays num_cells
+        order = np.argsort(self.parts, kind="stable")
+        self._slots = np.empty(num_cells + 1, dtype=np.int64)
+        self._slots[order] = np.arange(num_cells)
+        self._slots[num_cells] = num_cells
+        bounds = np.searchsorted(self.parts[order], np.arange(self.processes + 1))
+        neighbour_slots = self._slots[neighbour_indices][:, order]
+        partitions = [Partition(bounds[part], bounds[part + 1], neighbour_slots, num_cells) for part in range(self.processes)]
+        self.halo_sizes = [len(partition.halo) for partition in partitions]
+
+        # Two generations of cell states, the current one is _buffers[_parity]
+        self._memory = shared_memory.SharedMemory(create=True, size=max(2 * num_cells, 1))
+        self._buffers = np.ndarray((2, num_cells), np.uint8, buffer=self._memory.buf)
+        self._parity = 0
+        self._buffers[0, self._slots[:num_cells]] = np.random.default_rng(seed).random(num_cells) < INITIAL_ON_CHANCE
+        self.generation = 0
+        self.version = 0
+        self.set_rule(on_rule, off_rule)
+
+        barrier = Barrier(self.processes)
+        self._connections: List[Connection] = []
+        self._workers: List[Process] = []
+        for part, partition in enumerate(partitions):
+            connection, worker_connection = Pipe()
+            worker = Process(target=_run_partition, args=(worker_connection, barrier, self._memory.name, num_cells, partition),
+                             name=f"Partition-{part}", daemon=True)
+            worker.start()
+            self._connections.append(connection)
+            self._workers.append(worker)
+
+    @property
+    def values(self) -> np.ndarray:
+        """Cell values of the current generation, a copy in cell order (changing it does not change the cells)."""
+        return self._buffers[self._parity, self._slots[:self.num_cells]]
+
+    def set_rule(self, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...]):
+        """Updates the rule sets used for automaton transitions, see compile_rule_table."""
+        self.on_rule, self.off_rule = on_rule, off_rule
+        self.rule_table = compile_rule_table(on_rule, off_rule, self.max_count)
+
+    def set_values(self, indices: np.ndarray, value: int):
+        """Sets the value of a batch of cells."""
+        self._buffers[self._parity, self._slots[indices]] = bool(value)
+        self.version += 1
+
+    def step(self):
+        """Advances the automaton by one generation."""
+        self.advance(1)
+
+    def advance(self, generations: int):
+        """Advances the automaton by a number of generations, the workers step them all before reporting back.
+        Raises:
+            RuntimeError: If a worker failed, the engine cannot be used after that.
+        """
+        if generations <= 0:
+            return
+        for connection in self._connections:
+            connection.send((generations, self._parity, self.rule_table))
+        errors = [error for error in (connection.recv() for connection in self._connections) if error is not None]
+        if errors:
+            raise RuntimeError(f"Partition worker failed: {errors[0]}")
+        self._parity ^= generations & 1
+        self.generation += generations
+        self.version += 1
+
+    def close(self):
+        """Stops the workers and frees the shared state."""
+        for connection, worker in zip(self._connections, self._workers):
+            if worker.is_alive():
+                connection.send(None)
+            worker.join()
+            connection.close()
+        self._workers, self._connections = [], []
+        self._buffers = None
+        self._memory.close()
+        self._memory.unlink()
+
+    def __enter__(self) -> "PartitionedEngine":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _run_partition(connection: Connection, barrier, memory_name: str, num_cells: int, partition: Partition):
+    """Worker process: steps one partition whenever the engine asks, until it sends None."""
+    memory = shared_memory.SharedMemory(name=memory_name)
+    buffers = np.ndarray((2, num_cells), np.uint8, buffer=memory.buf)
+    start, stop, halo = partition.start, partition.stop, partition.halo
+    num_owned = stop - start
+    local = np.zeros(num_owned + len(halo) + 1, dtype=np.uint8)  # Trailing padding slot stays 0
+    counts = np.zeros(num_owned, dtype=np.uint8)
+    try:
+        while True:
+            command = connection.recv()
+            if command is None:
+                break
+            generations, parity, rule_table = command
+            try:
+                local[:num_owned] = buffers[parity, start:stop]  # Picks up any edits made between commands
+                for _ in range(generations):
+                    local[num_owned:-1] = buffers[parity, halo]  # Halo gather
+                    counts[:] = 0
+                    for column in partition.neighbour_indices:
+                        counts += local[column]
+                    local[:num_owned] = rule_table[local[:num_owned], counts]
+                    parity ^= 1
+                    buffers[parity, start:stop] = local[:num_owned]
+                    # Nobody reads the next generation's halo until every partition has written it, and nobody
+                    # overwrites this generation's buffer until every partition has read its halo from it
+                    barrier.wait()
+                connection.send(None)
+            except Exception as error:
+                barrier.abort()  # Releases the other workers instead of leaving them waiting
+                connection.send(repr(error))
+    finally:
+        del buffers
+        memory.close()
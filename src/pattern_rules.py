@@ -0,0 +1,97 @@
+import re
+from typing import Dict, NamedTuple, Tuple
+
+import numpy as np
+
+PATTERN_REGEX = r'^[01]+$'
+MAX_PATTERN_NEIGHBOURS = 20  # Rings longer than this would need a table of millions of patterns per ring size
+
+
+class PatternRule(NamedTuple):
+    """
+    Next values by the pattern of 'on' neighbours around a cell rather than just their number.
+    A pattern is a string of 0s and 1s, one per neighbour in cyclic order around the cell, e.g. "110100000000" for
+    a cell with 12 neighbours. Patterns are the same under rotation, as a ring has no first neighbour, and on
+    non-orientable meshes also under reflection, as there is no consistent way round.
+    Patterns that are not listed follow the totalistic on/off rule for their number of 'on' neighbours.
+    """
+    on_patterns: Dict[str, int]  # Next value of 'on' cells with these patterns around them
+    off_patterns: Dict[str, int]  # Next value of 'off' cells
+
+
+def parse_pattern(text: str) -> Tuple[str, int]:
+    """Converts an entry such as '110100000000=1' into a (pattern, next value) pair."""
+    pattern, _, value = text.partition("=")
+    if not re.fullmatch(PATTERN_REGEX, pattern) or value not in ("0", "1"):
+        raise ValueError(f"Invalid pattern entry '{text}', expected a string of 0s and 1s, '=' and the next value 0 or 1")
+    return pattern, int(value)
+
+
+def canonical_patterns(size: int, reflections: bool = False) -> np.ndarray:
+    """
+    Returns the canonical form of every pattern of a ring of `size` neighbours: the smallest of its rotations
+    (and reflections). Bit k of a pattern is the value of neighbour k.
+    """
+    patterns = np.arange(1 << size, dtype=np.int64)
+    mask = (1 << size) - 1
+    variants = [patterns]
+    if reflections:
+        mirrored = np.zeros_like(patterns)
+        for bit in range(size):
+            mirrored |= ((patterns >> bit) & 1) << (size - 1 - bit)
+        variants.append(mirrored)
+    canonical = patterns.copy()
+    for variant in variants:
+        for shift in range(size):
+            np.minimum(canonical, ((variant >> shift) | (variant << (size - shift))) & mask, out=canonical)
+    return canonical
+
+
+def compile_pattern_table(count_table: np.ndarray, patterns: PatternRule, ring_sizes: np.ndarray, reflections: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds the lookup table of next values indexed by [current value, pattern code] for pattern rules.
+    A cell's pattern code is its ring's offset plus the pattern's bits, bit k being neighbour k, so stepping
+    only needs a shift and an add per neighbour slot, as cheap as counting.
+    Args:
+        count_table (np.ndarray): (2, K + 1) totalistic table for the patterns not listed, see compile_rule_table.
+        patterns (PatternRule): Next values of listed patterns.
+        ring_sizes (np.ndarray): (F,) number of neighbours of each cell, at most K.
+        reflections (bool): Whether mirrored patterns are the same pattern, for non-orientable meshes.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (2, P) table and the (F,) offset of each cell's ring in it.
+    Raises:
+        ValueError: If a ring is longer than MAX_PATTERN_NEIGHBOURS, an entry is not a valid pattern, fits no cell
+                    of the mesh, or is the same pattern as another entry with a different next value.
+    """
+    sizes = np.unique(ring_sizes)
+    if len(sizes) and sizes[-1] > MAX_PATTERN_NEIGHBOURS:
+        raise ValueError(f"Pattern rules support up to {MAX_PATTERN_NEIGHBOURS} neighbours, the mesh has cells with {sizes[-1]}")
+    for listed in (patterns.off_patterns, patterns.on_patterns):
+        for pattern, value in listed.items():
+            if not re.fullmatch(PATTERN_REGEX, pattern) or value not in (0, 1):
+                raise ValueError(f"Invalid pattern entry '{pattern}': {value}, expected a string of 0s and 1s and a next value of 0 or 1")
+            if len(pattern) not in sizes:  # Likely mistyped, it would never apply
+                raise ValueError(f"Pattern '{pattern}' has {len(pattern)} neighbours, cells of this mesh have {', '.join(map(str, sizes.tolist()))}")
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum([1 << int(size) for size in sizes], out=offsets[1:])
+    table = np.zeros((2, max(offsets[-1], 1)), dtype=np.uint8)
+
+    for ring, size in enumerate(sizes.tolist()):
+        canonical = canonical_patterns(size, reflections)
+        counts = np.zeros(1 << size, dtype=np.int64)  # 'on' neighbours of every pattern
+        for bit in range(size):
+            counts += (np.arange(1 << size) >> bit) & 1
+        for row, listed in enumerate((patterns.off_patterns, patterns.on_patterns)):
+            values = count_table[row, counts]
+            chosen: Dict[int, int] = {}
+            for pattern, value in listed.items():
+                if len(pattern) != size:
+                    continue  # For cells with another number of neighbours
+                key = int(canonical[int(pattern[::-1], 2)])  # Character k is bit k
+                if chosen.setdefault(key, value) != value:
+                    raise ValueError(f"Pattern '{pattern}' is listed with both next values (it matches another entry under rotation{' or reflection' if reflections else ''})")
+            for key, value in chosen.items():
+                values[canonical == key] = value
+            table[row, offsets[ring]:offsets[ring + 1]] = values
+    ring_offsets = offsets[np.searchsorted(sizes, ring_sizes)]
+    return table, ring_offsets
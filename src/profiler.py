@@ -0,0 +1,132 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+STATS_WINDOW_S = 2.0  # Rolling window the live stats are averaged over
+MAX_SAMPLES_PER_PHASE = 100_000
+MAX_TRACE_EVENTS = 1_000_000  # Oldest events are dropped beyond this
+
+# Phase names the control panel reports rates from
+STEP_PHASE = "Engine.calc_next_state"
+FRAME_PHASE = "App.render"
+
+
+class PhaseStats(NamedTuple):
+    """Timings of one phase over the rolling window."""
+    mean_ms: float
+    max_ms: float
+    calls_per_s: float
+    units_per_s: float  # Work units (e.g. cells) handled per second, see Profiler.instrument
+
+
+class Profiler:
+    """
+    Times selected methods and functions, for live stats and Chrome trace files.
+    Targets are only wrapped while the profiler is enabled, disabling puts the original attributes back,
+    so there is no cost at all when it is off.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self._targets: List[Tuple[Any, str, str, Optional[Callable[[Any], int]]]] = []
+        self._originals: List[Tuple[Any, str, Any]] = []
+        self._samples: Dict[str, Deque[Tuple[float, float, int]]] = {}  # Phase to (end time, duration, units)
+        self._trace_events: Deque[Dict[str, Any]] = deque(maxlen=MAX_TRACE_EVENTS)
+        self._trace_origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def instrument(self, owner: Any, name: str, phase: Optional[str] = None, units: Optional[Callable[[Any], int]] = None):
+        """
+        Registers an attribute to be timed while the profiler is enabled.
+        Args:
+            owner (Any): Class or module the attribute is looked up on, e.g. Engine.
+            name (str): Attribute name, e.g. "calc_next_state".
+            phase (Optional[str]): Name shown in the stats and trace, defaults to owner.name.
+            units (Optional[Callable[[Any], int]]): Called with the first argument (self for methods) to count the
+                work done per call, e.g. cells per step.
+        """
+        phase = phase or f"{getattr(owner, '__name__', owner)}.{name}"
+        self._targets.append((owner, name, phase, units))
+        if self.enabled:
+            self._patch(owner, name, phase, units)
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        for target in self._targets:
+            self._patch(*target)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def _patch(self, owner: Any, name: str, phase: str, units: Optional[Callable[[Any], int]]):
+        original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+        self._originals.append((owner, name, original))
+        setattr(owner, name, self._wrap(original, phase, units))
+
+    def _wrap(self, function: Callable, phase: str, units: Optional[Callable[[Any], int]]) -> Callable:
+        profiler = self
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.record(phase, start, time.perf_counter(), units(args[0]) if units else 1)
+        return timed
+
+    def record(self, phase: str, start: float, end: float, units: int = 1):
+        """Adds one timed call, from perf_counter start and end times."""
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = deque(maxlen=MAX_SAMPLES_PER_PHASE)
+        samples.append((end, end - start, units))
+        if self.tracing:
+            self._trace_events.append({"name": phase, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                                       "ts": (start - self._trace_origin) * 1e6, "dur": (end - start) * 1e6})
+
+    def stats(self) -> Dict[str, PhaseStats]:
+        """Returns the stats of every phase called within the last STATS_WINDOW_S seconds."""
+        cutoff = time.perf_counter() - STATS_WINDOW_S
+        stats = {}
+        for phase, samples in list(self._samples.items()):  # Phases can be added from other threads
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+            recent = list(samples)
+            if not recent:
+                continue
+            durations = [duration for _, duration, _ in recent]
+            stats[phase] = PhaseStats(1000 * sum(durations) / len(durations), 1000 * max(durations),
+                                      len(recent) / STATS_WINDOW_S, sum(units for _, _, units in recent) / STATS_WINDOW_S)
+        return stats
+
+    def start_trace(self):
+        """Starts collecting trace events, discarding any from an earlier trace."""
+        with self._lock:
+            self._trace_events.clear()
+            self.tracing = True
+
+    def stop_trace(self, file_name: str) -> int:
+        """Stops collecting trace events and writes them as a Chrome trace (chrome://tracing, Perfetto) file.
+        Returns the number of events written."""
+        with self._lock:
+            self.tracing = False
+            events = list(self._trace_events)
+            self._trace_events.clear()
+        names = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}}
+                 for thread in threading.enumerate()]
+        with open(file_name, "w") as file:
+            json.dump({"traceEvents": names + events, "displayTimeUnit": "ms"}, file)
+        return len(events)
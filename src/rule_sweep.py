@@ -0,0 +1,158 @@
+"""Surveys every on/off rule pair over a set of meshes and seeds, spread across a process pool.
+
+Each mesh's topology is built once and placed in shared memory, which the workers attach to instead of
+receiving a pickled copy per task. Results are appended to a CSV as they arrive, and rerunning with the
+same output file skips every (mesh, rule, seed) already in it.
+
+Usage:
+    python rule_sweep.py --seeds 16 --generations 500 --output sweep.csv
+"""
+import argparse
+import csv
+import glob
+import itertools
+import os
+from multiprocessing import Pool, shared_memory
+from typing import Dict, Iterator, List, Set, Tuple
+
+import numpy as np
+
+from helper_functions import load_and_validate_obj
+from headless import simulate
+from mesh import Mesh, EdgeAdjacency
+
+RULES = [tuple(int(i) for i in f"{n:04b}") for n in range(16)]  # Every 4 entry rule
+CSV_COLUMNS = ["mesh", "on_rule", "off_rule", "seed", "generations", "final_population", "transient", "period"]
+
+ArrayDescriptor = Tuple[str, Tuple[int, ...], str]  # Shared memory name, shape, dtype
+Task = Tuple[str, str, str, int]  # Mesh name, on rule, off rule, seed
+
+_worker_meshes: Dict[str, Mesh] = {}
+_worker_memory: List[shared_memory.SharedMemory] = []
+_worker_generations = 0
+
+
+class SharedTopology:
+    """Owns the shared memory blocks holding the topology of every mesh in a sweep."""
+
+    def __init__(self, meshes: Dict[str, Mesh]):
+        self.blocks: List[shared_memory.SharedMemory] = []
+        self.descriptors: Dict[str, Dict[str, ArrayDescriptor]] = {}
+        for name, mesh in meshes.items():
+            adjacency = mesh.edge_adjacency()
+            arrays = {"vertices": mesh.vertices, "faces": mesh.faces,
+                      "across": adjacency.across, "indptr": adjacency.indptr, "indices": adjacency.indices}
+            self.descriptors[name] = {key: self._share(array) for key, array in arrays.items()}
+
+    def _share(self, array: np.ndarray) -> ArrayDescriptor:
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        self.blocks.append(block)
+        return block.name, array.shape, array.dtype.str
+
+    def release(self):
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+
+def _attach(descriptor: ArrayDescriptor) -> np.ndarray:
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    _worker_memory.append(block)  # Keeps the mapping alive for the life of the worker
+    return np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def _init_worker(descriptors: Dict[str, Dict[str, ArrayDescriptor]], generations: int):
+    """Pool initializer, attaches every shared mesh once per worker process."""
+    global _worker_generations
+    _worker_generations = generations
+    for name, arrays in descriptors.items():
+        shared = {key: _attach(descriptor) for key, descriptor in arrays.items()}
+        adjacency = EdgeAdjacency(shared["across"], shared["indptr"], shared["indices"])
+        _worker_meshes[name] = Mesh(shared["vertices"], shared["faces"], edge_adjacency=adjacency)
+
+
+def _run_task(task: Task) -> Dict[str, object]:
+    mesh_name, on_rule, off_rule, seed = task
+    result = simulate(_worker_meshes[mesh_name], _worker_generations,
+                      tuple(int(i) for i in on_rule), tuple(int(i) for i in off_rule), seed)
+    return {"mesh": mesh_name, "on_rule": on_rule, "off_rule": off_rule, "seed": seed,
+            "generations": _worker_generations, "final_population": int(result.populations[-1]),
+            "transient": result.transient, "period": result.period}
+
+
+def _completed_tasks(output_file: str, generations: int) -> Set[Task]:
+    """Reads the tasks already in an output file, so an interrupted sweep can carry on where it stopped."""
+    if not os.path.exists(output_file):
+        return set()
+    # An interrupted write can leave half a row at the end of the file, cut it off before appending
+    with open(output_file, "rb+") as file:
+        contents = file.read()
+        if contents and not contents.endswith(b"\n"):
+            file.truncate(contents.rfind(b"\n") + 1)
+    with open(output_file, newline="") as file:
+        return {(row["mesh"], row["on_rule"], row["off_rule"], int(row["seed"]))
+                for row in csv.DictReader(file) if int(row["generations"]) == generations}
+
+
+def sweep_tasks(mesh_names: List[str], seeds: int) -> Iterator[Task]:
+    """Every (mesh, on rule, off rule, seed) combination of the sweep."""
+    rule_strings = ["".join(map(str, rule)) for rule in RULES]
+    for mesh_name, on_rule, off_rule, seed in itertools.product(mesh_names, rule_strings, rule_strings, range(seeds)):
+        yield mesh_name, on_rule, off_rule, seed
+
+
+def run_sweep(mesh_files: List[str], seeds: int, generations: int, output_file: str, processes: int = None) -> int:
+    """
+    Runs every rule pair on every mesh for a number of seeds, appending one CSV row per run.
+    Args:
+        mesh_files (List[str]): OBJ files to survey.
+        seeds (int): Number of seeds (0 to seeds - 1) per mesh and rule pair.
+        generations (int): Generations per run.
+        output_file (str): CSV file to append to, runs already in it are skipped.
+        processes (int): Worker processes, defaults to the CPU count.
+    Returns:
+        int: Number of runs performed.
+    """
+    meshes = {os.path.basename(path): load_and_validate_obj(path) for path in mesh_files}
+    done = _completed_tasks(output_file, generations)
+    tasks = [task for task in sweep_tasks(list(meshes), seeds) if task not in done]
+    if not tasks:
+        return 0
+
+    topology = SharedTopology(meshes)
+    write_header = not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+    try:
+        with open(output_file, "a", newline="") as file, \
+                Pool(processes, initializer=_init_worker, initargs=(topology.descriptors, generations)) as pool:
+            writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS)
+            if write_header:
+                writer.writeheader()
+            chunk_size = max(1, len(tasks) // ((processes or os.cpu_count() or 1) * 16))
+            for row in pool.imap_unordered(_run_task, tasks, chunksize=chunk_size):
+                writer.writerow(row)
+                file.flush()  # Everything written survives an interruption
+    finally:
+        topology.release()
+    return len(tasks)
+
+
+def main():
+    assets_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'assets')
+    parser = argparse.ArgumentParser(description="Run every on/off rule pair over a set of meshes and seeds.")
+    parser.add_argument("meshes", nargs="*", help="OBJ files to survey, defaults to every mesh in the assets folder")
+    parser.add_argument("--seeds", type=int, default=8, help="number of seeds per mesh and rule pair")
+    parser.add_argument("-n", "--generations", type=int, default=500, help="number of generations per run")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="worker processes, defaults to the CPU count")
+    parser.add_argument("-o", "--output", default="sweep.csv", help="CSV file to append results to")
+    args = parser.parse_args()
+
+    mesh_files = args.meshes or sorted(glob.glob(os.path.join(assets_root, "*.obj")))
+    runs = run_sweep(mesh_files, args.seeds, args.generations, args.output, args.processes)
+    print(f"Ran {runs} simulations, results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
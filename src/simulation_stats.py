@@ -0,0 +1,58 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+STATS_HISTORY_LENGTH = 1024  # Generations kept in the rolling history
+STATS_DTYPE = np.dtype([("generation", "<i8"), ("population", "<i8"), ("births", "<i8"), ("deaths", "<i8")])
+
+
+class GenerationStats(NamedTuple):
+    """Counts for one generation, births and deaths being the cells that turned on and off to reach it."""
+    generation: int
+    population: int
+    births: int
+    deaths: int
+    changed_fraction: float  # Share of all cells that changed, (births + deaths) / cells
+
+
+class StatsHistory:
+    """
+    Rolling history of the stats of the last STATS_HISTORY_LENGTH generations.
+    The engine appends to it as it steps; readers on other threads may see an entry that is one generation stale.
+    """
+
+    def __init__(self, num_cells: int, capacity: int = STATS_HISTORY_LENGTH):
+        if capacity < 1:
+            raise ValueError(f"Stats history capacity must be at least 1, got {capacity}")
+        self.num_cells = num_cells
+        self._records = np.zeros(capacity, dtype=STATS_DTYPE)
+        self._next = 0  # Slot the next record goes in
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, generation: int, population: int, births: int, deaths: int):
+        self._records[self._next] = (generation, population, births, deaths)
+        self._next = (self._next + 1) % len(self._records)
+        self._count = min(self._count + 1, len(self._records))
+
+    def latest(self) -> Optional[GenerationStats]:
+        """Returns the stats of the most recent generation, or None if nothing has been recorded."""
+        if not self._count:
+            return None
+        generation, population, births, deaths = self._records[self._next - 1].tolist()
+        return GenerationStats(generation, population, births, deaths, self._fraction(births + deaths))
+
+    def series(self, field: str) -> np.ndarray:
+        """Returns one of "generation", "population", "births", "deaths" or "changed_fraction" for every
+        generation held, oldest first."""
+        if field == "changed_fraction":
+            return self._fraction(self.series("births") + self.series("deaths"))
+        values = self._records[field]
+        if self._count < len(self._records):
+            return values[:self._count].copy()
+        return np.concatenate([values[self._next:], values[:self._next]])
+
+    def _fraction(self, changed):
+        return changed / max(self.num_cells, 1)
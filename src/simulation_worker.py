@@ -0,0 +1,214 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from automata_engine import Engine
+
+POLL_INTERVAL = 0.002  # Seconds between checks while waiting for the renderer to pick up a generation
+TURBO_BUDGET = 0.015  # Seconds of stepping per published generation in turbo mode, and per chunk of a jump
+MAX_CHUNK = 1 << 20  # Most generations advanced at once, cycles replay so fast that chunks would otherwise grow without bound
+RATE_WINDOW = 1.0  # Seconds of recent progress the reported generations/s is averaged over
+
+logger = logging.getLogger(__name__)
+
+
+class JumpReport(NamedTuple):
+    """How a finished (or cancelled) jump went."""
+    generations: int  # Generations advanced
+    seconds: float
+
+    @property
+    def generations_per_s(self) -> float:
+        return self.generations / self.seconds if self.seconds > 0 else 0.0
+
+
+class SimulationWorker:
+    """
+    Steps an Engine on a background thread so slow generations never hold up the render loop.
+    Finished generations are published into a double buffer, the renderer always reads the latest one.
+    Anything that changes the engine (rules, edits, clears) is sent through a command queue and applied
+    by the worker between steps, so the engine is only ever touched from one thread.
+    In turbo mode every published generation is the last of as many as fit in TURBO_BUDGET, and a jump computes
+    ahead to a target generation without publishing the ones in between.
+    """
+
+    def __init__(self, engine: Engine, interval: float = 0.0, paused: bool = False):
+        self.engine = engine
+        self.interval = interval  # Minimum seconds between generations
+        self.paused = paused
+        self.turbo = False  # Step for TURBO_BUDGET between published generations rather than once
+        self.jump_target: Optional[int] = None  # Generation being jumped to, if any
+        self.last_jump: Optional[JumpReport] = None
+        self.generations_per_s = 0.0  # Rate over the last RATE_WINDOW seconds
+        self.commands: "queue.Queue[Callable[[Engine], None]]" = queue.Queue()
+
+        self._lock = threading.Lock()
+        self._front = engine.values.copy()
+        self._back = np.empty_like(self._front)
+        self._front_version = engine.version
+        self._consumed = threading.Event()  # Set once the renderer has read the front buffer
+        self._consumed.set()
+        self._next_step = time.monotonic()
+        self._chunk = 1  # Generations advanced between clock checks, adapted to how long they take
+        self._jump_start: Tuple[float, int] = (0.0, 0)  # Time and generation the current jump started at
+        self._progress: Deque[Tuple[float, int]] = deque()  # (time, generation) samples for generations_per_s
+        self._running = False
+        self._thread = threading.Thread(target=self._run, name="SimulationWorker", daemon=True)
+
+    def start(self):
+        self._running = True
+        self._thread.start()
+
+    def stop(self):
+        """Stops the worker thread and waits for it to finish its current step."""
+        self._running = False
+        self.commands.put(lambda engine: None)  # Wake the thread up if it is waiting for commands
+        self._thread.join()
+
+    def submit(self, command: Callable[[Engine], None]):
+        """Queues a function to be called with the engine on the worker thread."""
+        self.commands.put(command)
+
+    def set_rule(self, on_rule: Tuple[int, ...], off_rule: Tuple[int, ...]):
+        self.submit(lambda engine: engine.set_rule(on_rule, off_rule))
+
+    def set_values(self, indices: np.ndarray, value: int):
+        self.submit(lambda engine: engine.set_values(indices, value))
+
+    def clear_values(self):
+        self.submit(lambda engine: engine.clear_values())
+
+    def jump_to(self, generation: int):
+        """Computes ahead to a generation, drawing nothing until it is reached. Generations already passed are ignored."""
+        def start(engine):
+            if generation > engine.generation:
+                self.jump_target = generation
+                self._jump_start = (time.monotonic(), engine.generation)
+        self.submit(start)
+
+    def cancel_jump(self):
+        """Stops a jump where it has got to."""
+        self.submit(lambda engine: self._finish_jump())
+
+    def set_paused(self, paused: bool):
+        if paused != self.paused:
+            self.paused = paused
+            self.commands.put(lambda engine: None)  # Wake the thread up so it notices
+
+    def set_turbo(self, turbo: bool):
+        if turbo != self.turbo:
+            self.turbo = turbo
+            self.commands.put(lambda engine: None)  # It may be waiting out the delay
+
+    @contextmanager
+    def latest(self) -> Iterator[Tuple[np.ndarray, int]]:
+        """Gives the values and engine version of the latest finished generation.
+        The buffer must not be kept after the with block, the worker reuses it."""
+        with self._lock:
+            yield self._front, self._front_version
+            self._consumed.set()
+
+    def _run(self):
+        while self._running:
+            self._apply_commands(self._time_until_step())
+            if self.jump_target is not None:  # Runs even while paused, e.g. from a state drawn in draw mode
+                self._advance_for(TURBO_BUDGET, self.jump_target - self.engine.generation)
+                if self.engine.generation >= self.jump_target:
+                    self._finish_jump()
+                continue
+            if self.paused:
+                self._progress.clear()
+                self.generations_per_s = 0.0
+                continue
+            if (not self.turbo and time.monotonic() < self._next_step) or not self._consumed.is_set():
+                continue
+            if self.turbo:
+                self._advance_for(TURBO_BUDGET)
+            else:
+                self.engine.step()
+                self._measure_rate()
+            self._next_step = time.monotonic() + self.interval
+            self._publish()
+
+    def _advance_for(self, budget: float, limit: Optional[int] = None):
+        """Advances the engine by up to `limit` generations for about `budget` seconds.
+        Generations go in chunks, doubled while they are quick and halved when slow, so the clock is checked
+        rarely on small meshes and a cycle the engine can replay is skipped through in a few calls."""
+        deadline = time.monotonic() + budget
+        while limit is None or limit > 0:
+            chunk = self._chunk if limit is None else min(self._chunk, limit)
+            start = time.monotonic()
+            self.engine.advance(chunk)
+            now = time.monotonic()
+            if limit is not None:
+                limit -= chunk
+            if now - start < budget / 4:
+                self._chunk = min(2 * self._chunk, MAX_CHUNK)
+            elif now - start > budget and self._chunk > 1:
+                self._chunk //= 2
+            if now >= deadline:
+                break
+        self._measure_rate()
+
+    def _finish_jump(self):
+        if self.jump_target is None:
+            return
+        start_time, start_generation = self._jump_start
+        self.last_jump = JumpReport(self.engine.generation - start_generation, time.monotonic() - start_time)
+        self.jump_target = None
+        self._publish()
+
+    def _measure_rate(self):
+        now = time.monotonic()
+        self._progress.append((now, self.engine.generation))
+        while now - self._progress[0][0] > RATE_WINDOW:
+            self._progress.popleft()
+        (first_time, first_generation), (last_time, last_generation) = self._progress[0], self._progress[-1]
+        if last_time > first_time:
+            self.generations_per_s = (last_generation - first_generation) / (last_time - first_time)
+
+    def _time_until_step(self):
+        """How long to wait for commands before the next step is due, None to wait indefinitely."""
+        if self.jump_target is not None:
+            return 0
+        if self.paused:
+            return None
+        if not self._consumed.is_set():
+            return POLL_INTERVAL
+        if self.turbo:
+            return 0
+        return max(0.0, self._next_step - time.monotonic())
+
+    def _apply_commands(self, timeout):
+        """Runs queued commands, waiting up to `timeout` for the first one.
+        A command that fails is logged and skipped, so the simulation keeps running."""
+        try:
+            command = self.commands.get(timeout=timeout) if timeout != 0 else self.commands.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            try:
+                command(self.engine)
+            except Exception:
+                logger.exception("Simulation command failed and was skipped")
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                break
+        self._publish()
+
+    def _publish(self):
+        """Copies the engine's values into the back buffer and makes it the front one."""
+        if self._front_version == self.engine.version:
+            return
+        np.copyto(self._back, self.engine.values)
+        with self._lock:
+            self._front, self._back = self._back, self._front
+            self._front_version = self.engine.version
+            self._consumed.clear()
@@ -0,0 +1,225 @@
+import numpy as np
+
+
+class TriangleGrid:
+    """
+    Uniform grid over a set of 2D triangles for point-in-triangle lookups.
+    Each grid cell lists the triangles whose bounding boxes overlap it, so a query only tests
+    the handful of triangles in the point's grid cell. Where triangles overlap the lowest index wins.
+    """
+
+    def __init__(self, triangles: np.ndarray, triangles_per_cell: float = 2.0):
+        """
+        Args:
+            triangles (np.ndarray): (F, 3, 2) triangle vertex positions.
+            triangles_per_cell (float): Average number of triangles aimed for in each grid cell.
+        """
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.float64)
+        num_triangles = len(self.triangles)
+
+        # Barycentric setup of every triangle, shared by all queries
+        self.origins = self.triangles[:, 0]
+        self.v0 = self.triangles[:, 2] - self.origins
+        self.v1 = self.triangles[:, 1] - self.origins
+        self.dot00 = np.einsum("ij,ij->i", self.v0, self.v0)
+        self.dot01 = np.einsum("ij,ij->i", self.v0, self.v1)
+        self.dot11 = np.einsum("ij,ij->i", self.v1, self.v1)
+        self.denom = self.dot00 * self.dot11 - self.dot01 * self.dot01
+
+        # Grid covering the bounding box of all triangles with roughly square cells
+        lows, highs = self.triangles.min(axis=1), self.triangles.max(axis=1)
+        self.origin = lows.min(axis=0)
+        extent = np.maximum(highs.max(axis=0) - self.origin, 1e-12)
+        cell_size = np.sqrt(extent[0] * extent[1] * triangles_per_cell / max(num_triangles, 1))
+        self.shape = np.maximum(np.ceil(extent / max(cell_size, 1e-12)), 1).astype(np.int64)
+        self.cell_size = extent / self.shape
+
+        # Insert each triangle into every grid cell its bounding box touches
+        first_cell = self._grid_coords(lows)
+        last_cell = self._grid_coords(highs)
+        spans = last_cell - first_cell + 1
+        counts = spans[:, 0] * spans[:, 1]
+        owners = np.repeat(np.arange(num_triangles), counts)
+        offsets = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = first_cell[owners, 0] + offsets % spans[owners, 0]
+        cell_y = first_cell[owners, 1] + offsets // spans[owners, 0]
+        cell_ids = cell_y * self.shape[0] + cell_x
+
+        # CSR from grid cell to triangles, sorted by triangle index within a grid cell
+        order = np.lexsort((owners, cell_ids))
+        self.cell_triangles = owners[order]
+        self.cell_starts = np.searchsorted(cell_ids[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def _grid_coords(self, points: np.ndarray) -> np.ndarray:
+        """Returns the grid cell (x, y) containing each point, clamped to the grid."""
+        coords = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(coords, 0, self.shape - 1)
+
+    def query(self, x: float, y: float) -> int:
+        """Returns the index of the triangle containing the point (x, y), or -1 if there is none."""
+        return int(self.query_many(np.array([[x, y]], dtype=np.float64))[0])
+
+    def query_many(self, points: np.ndarray) -> np.ndarray:
+        """
+        Finds the triangle containing each of a batch of points, e.g. the samples of a brush stroke.
+        Args:
+            points (np.ndarray): (N, 2) query positions.
+        Returns:
+            np.ndarray: (N,) triangle index per point, -1 where no triangle contains it.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(points), -1, dtype=np.int64)
+        inside_grid = np.all((points >= self.origin) & (points <= self.origin + self.cell_size * self.shape), axis=1)
+        point_ids = np.flatnonzero(inside_grid)
+        coords = self._grid_coords(points[point_ids])
+        cell_ids = coords[:, 1] * self.shape[0] + coords[:, 0]
+
+        # Expand every point into (point, candidate triangle) pairs
+        starts, ends = self.cell_starts[cell_ids], self.cell_starts[cell_ids + 1]
+        counts = ends - starts
+        pair_points = np.repeat(point_ids, counts)
+        pair_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        pair_triangles = self.cell_triangles[np.repeat(starts, counts) + pair_offsets]
+
+        hits = self._contains(pair_triangles, points[pair_points])
+        # Candidates are sorted by triangle index, so the first hit for each point is the lowest index
+        hit_points, hit_triangles = pair_points[hits], pair_triangles[hits]
+        unique_points, first = np.unique(hit_points, return_index=True)
+        result[unique_points] = hit_triangles[first]
+        return result
+
+    def _contains(self, triangle_ids: np.ndarray, points: np.ndarray) -> np.ndarray:
+        """Barycentric point-in-triangle test for matching arrays of triangles and points."""
+        v2 = points - self.origins[triangle_ids]
+        dot02 = np.einsum("ij,ij->i", self.v0[triangle_ids], v2)
+        dot12 = np.einsum("ij,ij->i", self.v1[triangle_ids], v2)
+        dot00, dot01, dot11 = self.dot00[triangle_ids], self.dot01[triangle_ids], self.dot11[triangle_ids]
+        denom = self.denom[triangle_ids]
+        valid = denom != 0  # Degenerate triangles contain nothing
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = (dot11 * dot02 - dot01 * dot12) / denom
+            v = (dot00 * dot12 - dot01 * dot02) / denom
+        return valid & (u >= 0) & (v >= 0) & (u + v <= 1)
+
+
+class TriangleBVH:
+    """
+    Bounding volume hierarchy over a set of 3D triangles for ray picking.
+    Triangles are sorted along a Morton curve through their centroids and split into leaves of LEAF_SIZE,
+    which become the bottom level of a complete binary tree; node n has children 2n + 1 and 2n + 2.
+    Rays walk the tree together a few levels at a time, so a query is a handful of array operations per step.
+    """
+    LEAF_SIZE = 4
+    MORTON_BITS = 10  # Per axis, centroids are quantized to a 1024^3 grid
+    LEVEL_STRIDE = 3  # Levels descended per query step, each pair expands into 2^3 descendants
+
+    def __init__(self, triangles: np.ndarray):
+        """
+        Args:
+            triangles (np.ndarray): (F, 3, 3) triangle vertex positions.
+        """
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.float64)
+        num_triangles = len(self.triangles)
+
+        # Möller-Trumbore setup of every triangle, shared by all queries
+        self.origins = self.triangles[:, 0]
+        self.edge1 = self.triangles[:, 1] - self.origins
+        self.edge2 = self.triangles[:, 2] - self.origins
+
+        self.order = np.argsort(self._morton_codes(self.triangles.mean(axis=1)), kind="stable")
+        num_leaves = max(1, -(-num_triangles // self.LEAF_SIZE))
+        self.depth = int(np.ceil(np.log2(num_leaves)))
+        self.first_leaf = (1 << self.depth) - 1
+        num_nodes = self.first_leaf + (1 << self.depth)
+
+        # Leaf bounds from the sorted triangles, empty leaves past the end keep inverted bounds that no ray hits
+        self.lows = np.full((num_nodes, 3), np.inf)
+        self.highs = np.full((num_nodes, 3), -np.inf)
+        if num_triangles:
+            starts = np.arange(0, num_triangles, self.LEAF_SIZE)
+            leaves = self.first_leaf + np.arange(len(starts))
+            self.lows[leaves] = np.minimum.reduceat(self.triangles.min(axis=1)[self.order], starts)
+            self.highs[leaves] = np.maximum.reduceat(self.triangles.max(axis=1)[self.order], starts)
+        # Each level's bounds enclose its children's
+        for level in range(self.depth - 1, -1, -1):
+            nodes = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+            self.lows[nodes] = np.minimum(self.lows[2 * nodes + 1], self.lows[2 * nodes + 2])
+            self.highs[nodes] = np.maximum(self.highs[2 * nodes + 1], self.highs[2 * nodes + 2])
+
+    def _morton_codes(self, points: np.ndarray) -> np.ndarray:
+        """Interleaves the bits of the quantized point coordinates, so nearby points get nearby codes."""
+        if len(points) == 0:
+            return np.zeros(0, dtype=np.int64)
+        low, extent = points.min(axis=0), np.maximum(np.ptp(points, axis=0), 1e-12)
+        grid = np.minimum((points - low) / extent * (1 << self.MORTON_BITS), (1 << self.MORTON_BITS) - 1).astype(np.int64)
+        codes = np.zeros(len(points), dtype=np.int64)
+        for bit in range(self.MORTON_BITS):
+            for axis in range(3):
+                codes |= ((grid[:, axis] >> bit) & 1) << (3 * bit + axis)
+        return codes
+
+    def query(self, origin: np.ndarray, direction: np.ndarray) -> int:
+        """Returns the index of the first triangle hit by a ray, or -1 if it hits none."""
+        return int(self.query_many(np.reshape(origin, (1, 3)), np.reshape(direction, (1, 3)))[0])
+
+    def query_many(self, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """
+        Finds the nearest triangle hit by each of a batch of rays, e.g. the samples of a brush stroke.
+        Triangles are hit from either side; where two are hit at the same distance the lowest index wins.
+        Args:
+            origins (np.ndarray): (N, 3) ray start points, nothing behind them is hit.
+            directions (np.ndarray): (N, 3) ray directions, need not be normalized.
+        Returns:
+            np.ndarray: (N,) triangle index per ray, -1 where it hits none.
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        result = np.full(len(origins), -1, dtype=np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = 1 / directions
+
+            # Walk down the tree with every (ray, node) pair whose ray hits the node's box,
+            # LEVEL_STRIDE levels at a time so there are few steps even for deep trees
+            level = self.depth % self.LEVEL_STRIDE
+            level_nodes = np.arange((1 << level) - 1, (1 << (level + 1)) - 1)
+            rays = np.repeat(np.arange(len(origins)), len(level_nodes))
+            nodes = np.tile(level_nodes, len(origins))
+            while True:
+                t1 = (self.lows[nodes] - origins[rays]) * inverse[rays]
+                t2 = (self.highs[nodes] - origins[rays]) * inverse[rays]
+                near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+                far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+                hit = (far >= np.maximum(near, 0)) & (self.lows[nodes, 0] <= self.highs[nodes, 0])  # Empty boxes are inverted
+                rays, nodes = rays[hit], nodes[hit]
+                if level == self.depth:
+                    break
+                # The descendants of node n LEVEL_STRIDE levels down are (n + 1) * 2^stride - 1 onwards
+                span = 1 << self.LEVEL_STRIDE
+                rays, nodes = np.repeat(rays, span), ((nodes[:, None] + 1) * span - 1 + np.arange(span)).ravel()
+                level += self.LEVEL_STRIDE
+
+            # Expand the leaves into (ray, triangle) pairs
+            slots = ((nodes - self.first_leaf) * self.LEAF_SIZE)[:, None] + np.arange(self.LEAF_SIZE)
+            rays = np.broadcast_to(rays[:, None], slots.shape)[slots < len(self.order)]
+            candidates = self.order[slots[slots < len(self.order)]]
+            distances = self._intersect(candidates, origins[rays], directions[rays])
+
+        hits = np.isfinite(distances)
+        rays, candidates, distances = rays[hits], candidates[hits], distances[hits]
+        order = np.lexsort((candidates, distances, rays))
+        first = order[np.r_[True, rays[order][1:] != rays[order][:-1]]] if len(order) else order
+        result[rays[first]] = candidates[first]
+        return result
+
+    def _intersect(self, triangle_ids: np.ndarray, origins: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Möller-Trumbore test for matching arrays of triangles and rays, the distance along each ray or inf on a miss."""
+        edge1, edge2 = self.edge1[triangle_ids], self.edge2[triangle_ids]
+        p = np.cross(directions, edge2)
+        det = np.einsum("ij,ij->i", edge1, p)
+        s = origins - self.origins[triangle_ids]
+        q = np.cross(s, edge1)
+        u = np.einsum("ij,ij->i", s, p) / det
+        v = np.einsum("ij,ij->i", directions, q) / det
+        t = np.einsum("ij,ij->i", edge2, q) / det
+        hit = (det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+        return np.where(hit, t, np.inf)
@@ -0,0 +1,232 @@
+"""Interchangeable kernels that work out which cells change in the next generation.
+
+Every backend returns exactly the same cells in the same (ascending) order, so the engine's states do not depend
+on which one runs. `select_backend` times the available ones on the engine's own mesh and keeps the fastest,
+logging the choice and why any backend was left out.
+"""
+import importlib.util
+import logging
+import time
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_RUNS = 3  # Timed sweeps per backend, the fastest is kept
+PYTHON_MAX_CELLS = 20_000  # Above this the pure Python backend is not worth timing, it cannot win
+
+
+class SteppingBackend:
+    """Finds the cells whose value changes in the next generation."""
+    name = ""
+
+    @classmethod
+    def available(cls) -> bool:
+        """Whether the backend can run here, e.g. that its optional dependency is installed."""
+        return True
+
+    def prepare(self, neighbour_indices: np.ndarray, pattern_offsets: Optional[np.ndarray] = None):
+        """
+        Called whenever the neighbours or the kind of rule change, before any call to changed_cells.
+        Args:
+            neighbour_indices (np.ndarray): Padded (K, F) neighbour table.
+            pattern_offsets (Optional[np.ndarray]): (F,) offset of each cell's ring in a pattern rule table, then
+                rules are looked up by offset + sum of (neighbour k's value) << k instead of by the 'on' count.
+        """
+        self.neighbour_indices = neighbour_indices
+        self.pattern_offsets = pattern_offsets
+
+    def changed_cells(self, state: np.ndarray, rule_table: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+        """
+        Args:
+            state (np.ndarray): (F + 1) uint8 cell values, the last slot being the always 'off' padding cell.
+            rule_table (np.ndarray): (2, K + 1) next value by [current value, number of 'on' neighbours],
+                or with pattern offsets (2, P) next value by [current value, pattern code].
+            active (Optional[np.ndarray]): Ascending indices of the only cells that can change, None for all of them.
+        Returns:
+            np.ndarray: Ascending int64 indices of the cells whose value changes.
+        """
+        raise NotImplementedError
+
+
+class PythonBackend(SteppingBackend):
+    """Walks a list of neighbour lists cell by cell, with no dependencies beyond the standard library."""
+    name = "python"
+
+    def prepare(self, neighbour_indices: np.ndarray, pattern_offsets: Optional[np.ndarray] = None):
+        super().prepare(neighbour_indices, pattern_offsets)
+        padding = neighbour_indices.shape[1]
+        if pattern_offsets is None:
+            self.neighbours = [[j for j in row if j != padding] for row in neighbour_indices.T.tolist()]
+        else:  # Patterns need every slot in place, padding included
+            self.neighbours = neighbour_indices.T.tolist()
+            self.offsets = pattern_offsets.tolist()
+
+    def changed_cells(self, state: np.ndarray, rule_table: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+        values, table, neighbours = state.tolist(), rule_table.tolist(), self.neighbours
+        cells = range(len(neighbours)) if active is None else active.tolist()
+        if self.pattern_offsets is None:
+            changed = [cell for cell in cells if table[values[cell]][sum(values[j] for j in neighbours[cell])] != values[cell]]
+        else:
+            offsets = self.offsets
+            changed = [cell for cell in cells
+                       if table[values[cell]][offsets[cell] + sum(values[j] << k for k, j in enumerate(neighbours[cell]))] != values[cell]]
+        return np.array(changed, dtype=np.int64)
+
+
+class NumpyBackend(SteppingBackend):
+    """Counts 'on' neighbours one neighbour slot at a time over every cell (or every active cell) at once."""
+    name = "numpy"
+
+    def changed_cells(self, state: np.ndarray, rule_table: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+        if self.pattern_offsets is not None:
+            return self._changed_by_pattern(state, rule_table, active)
+        num_cells = len(state) - 1
+        values = state[:num_cells]
+        if active is None:
+            counts = np.zeros(num_cells, dtype=np.uint8)  # Count 'on' neighbours
+            for column in self.neighbour_indices:
+                counts += state[column]
+            return np.flatnonzero(rule_table[values, counts] != values)
+        counts = np.zeros(len(active), dtype=np.uint8)
+        for column in self.neighbour_indices:
+            counts += state[column[active]]
+        current = values[active]
+        return active[rule_table[current, counts] != current]
+
+    def _changed_by_pattern(self, state: np.ndarray, rule_table: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+        # Builds the codes from the last slot down, shifting the earlier slots' bits up as it goes
+        cells = slice(None) if active is None else active
+        codes = np.zeros(self.neighbour_indices.shape[1] if active is None else len(active), dtype=np.int64)
+        for column in self.neighbour_indices[::-1]:
+            codes <<= 1
+            codes += state[column[cells]]
+        codes += self.pattern_offsets[cells]
+        current = state[:-1][cells]
+        changed = rule_table[current, codes] != current
+        return np.flatnonzero(changed) if active is None else active[changed]
+
+
+_numba_kernel = None
+
+
+def _compile_numba_kernel():
+    """Compiles the numba kernel on first use, numba itself is only imported here."""
+    global _numba_kernel
+    if _numba_kernel is None:
+        from numba import njit
+
+        @njit(nogil=True)
+        def changed_kernel(state, neighbour_indices, rule_table, cells, offsets, shift, out):
+            # shift is 1 for pattern codes, each slot being a bit, and 0 for counts
+            found = 0
+            for i in range(len(cells)):
+                cell = cells[i]
+                count = offsets[cell]
+                for slot in range(neighbour_indices.shape[0]):
+                    count += np.int64(state[neighbour_indices[slot, cell]]) << (slot * shift)
+                if rule_table[state[cell], count] != state[cell]:
+                    out[found] = cell
+                    found += 1
+            return found
+        _numba_kernel = changed_kernel
+    return _numba_kernel
+
+
+class NumbaBackend(SteppingBackend):
+    """One compiled pass over the cells, counting and applying the rule without temporary arrays. Needs numba."""
+    name = "numba"
+
+    @classmethod
+    def available(cls) -> bool:
+        return importlib.util.find_spec("numba") is not None
+
+    def prepare(self, neighbour_indices: np.ndarray, pattern_offsets: Optional[np.ndarray] = None):
+        super().prepare(neighbour_indices, pattern_offsets)
+        self.kernel = _compile_numba_kernel()
+        num_cells = neighbour_indices.shape[1]
+        self.all_cells = np.arange(num_cells, dtype=np.int64)
+        self.offsets = np.zeros(num_cells, dtype=np.int64) if pattern_offsets is None else pattern_offsets.astype(np.int64)
+        self.out = np.empty(num_cells, dtype=np.int64)
+
+    def changed_cells(self, state: np.ndarray, rule_table: np.ndarray, active: Optional[np.ndarray]) -> np.ndarray:
+        cells = self.all_cells if active is None else active
+        shift = 0 if self.pattern_offsets is None else 1
+        found = self.kernel(state, self.neighbour_indices, rule_table, cells, self.offsets, shift, self.out)
+        return self.out[:found].copy()
+
+
+BACKENDS: Dict[str, Type[SteppingBackend]] = {backend.name: backend for backend in (PythonBackend, NumpyBackend, NumbaBackend)}
+REFERENCE_BACKEND = "numpy"  # What the others are checked against during calibration
+
+# Backend picked for each (cell count magnitude, neighbour slots, pattern rule), so engines of similar meshes are only calibrated once
+_selected: Dict[Tuple[int, int, bool], str] = {}
+
+
+def make_backend(name: str) -> SteppingBackend:
+    """
+    Creates a backend by name.
+    Raises:
+        ValueError: If there is no such backend, or it cannot run here.
+    """
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown stepping backend '{name}', expected one of {tuple(BACKENDS)}")
+    if not backend.available():
+        raise ValueError(f"Stepping backend '{name}' is not available, is its dependency installed?")
+    return backend()
+
+
+def select_backend(state: np.ndarray, neighbour_indices: np.ndarray, rule_table: np.ndarray, pattern_offsets: Optional[np.ndarray] = None) -> SteppingBackend:
+    """
+    Picks the fastest available backend for a mesh by timing full sweeps of its current state.
+    Backends whose result differs from the reference are left out. The choice is logged and remembered
+    for meshes with the same neighbour slots and a cell count of the same power of two, and the same kind of rule.
+    Returns:
+        SteppingBackend: The chosen backend, already prepared with the neighbour table.
+    """
+    num_cells = neighbour_indices.shape[1]
+    key = (num_cells.bit_length(), len(neighbour_indices), pattern_offsets is not None)
+    if key in _selected:
+        backend = BACKENDS[_selected[key]]()
+        backend.prepare(neighbour_indices, pattern_offsets)
+        return backend
+
+    reference = NumpyBackend()
+    reference.prepare(neighbour_indices, pattern_offsets)
+    sample = np.arange(0, num_cells, 7)  # Checks the active set path as well as the full sweep
+    expected = [reference.changed_cells(state, rule_table, active) for active in (None, sample)]
+    timings: Dict[str, float] = {}
+    skipped: List[str] = []
+    for name, backend_class in BACKENDS.items():
+        if not backend_class.available():
+            skipped.append(f"{name} (not installed)")
+            continue
+        if backend_class is PythonBackend and num_cells > PYTHON_MAX_CELLS:
+            skipped.append(f"{name} (too many cells)")
+            continue
+        backend = reference if name == REFERENCE_BACKEND else backend_class()
+        if backend is not reference:
+            backend.prepare(neighbour_indices, pattern_offsets)
+            results = [backend.changed_cells(state, rule_table, active) for active in (None, sample)]  # Also warms up any JIT
+            if not all(np.array_equal(result, reference_result) for result, reference_result in zip(results, expected)):
+                logger.error("Stepping backend %s disagrees with %s and was left out", name, REFERENCE_BACKEND)
+                continue
+        timings[name] = min(_time_sweep(backend, state, rule_table) for _ in range(CALIBRATION_RUNS))
+
+    fastest = min(timings, key=timings.get)
+    _selected[key] = fastest
+    logger.info("Stepping backend for %d cells: %s (%s)%s", num_cells, fastest,
+                ", ".join(f"{name} {1000 * seconds:.2f} ms" for name, seconds in timings.items()),
+                f", skipped {', '.join(skipped)}" if skipped else "")
+    backend = reference if fastest == REFERENCE_BACKEND else BACKENDS[fastest]()
+    if backend is not reference:
+        backend.prepare(neighbour_indices, pattern_offsets)
+    return backend
+
+
+def _time_sweep(backend: SteppingBackend, state: np.ndarray, rule_table: np.ndarray) -> float:
+    start = time.perf_counter()
+    backend.changed_cells(state, rule_table, None)
+    return time.perf_counter() - start